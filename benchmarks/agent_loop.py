@@ -0,0 +1,95 @@
+"""
+Benchmark the agent loop and the other LLM callers end-to-end offline, with
+the replay backend standing in for the OpenAI API.
+
+Responses come from LLM_REPLAY_FILE if it exists (record one from a real
+session with LLM_RECORD_FILE=llm_replay.jsonl), otherwise every reply is a
+do_nothing command. Run with --latency 0 to measure Auto-GPT's own overhead.
+tiktoken must already have its encodings cached.
+
+Usage:
+
+    python benchmarks/agent_loop.py --steps 50 --latency 0.5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts'))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the agent loop against replayed LLM responses.')
+    parser.add_argument('--steps', type=int, default=50, help='Agent loop steps to run')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated seconds per LLM request')
+    parser.add_argument('--replay-file', default=os.path.abspath('llm_replay.jsonl'), help='Recorded responses')
+    return parser.parse_args()
+
+
+def report(label, timings):
+    timings = np.array(timings) * 1000
+    print(f"{label:<28} {len(timings):>6} {timings.mean():>10.2f} "
+          f"{np.percentile(timings, 50):>10.2f} {np.percentile(timings, 99):>10.2f}")
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_arguments()
+    os.environ["LLM_BACKEND"] = "replay"
+    os.environ["LLM_REPLAY_FILE"] = args.replay_file
+    os.environ["LLM_REPLAY_LATENCY"] = str(args.latency)
+    os.environ["MEMORY_BACKEND"] = "local"
+    os.environ["EMBEDDING_CACHE"] = "False"
+    # Memory files are written to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="agent-loop-"))
+
+    sys.path.append(SCRIPTS_DIR)
+    import agent_manager
+    import browse
+    import chat
+    import commands as cmd
+    from call_ai_function import call_ai_function
+    from config import Config
+    from context_window import ContextWindow
+    from memory import get_memory
+
+    cfg = Config()
+    memory = get_memory(cfg, init=True)
+    prompt = open(os.path.join(SCRIPTS_DIR, 'data/prompt.txt')).read()
+    user_input = "Determine which next command to use, and respond using the format specified above:"
+    full_message_history = []
+    context_window = ContextWindow(cfg.fast_llm_model)
+
+    def step():
+        reply = chat.chat_with_ai(
+            prompt, user_input, full_message_history, memory, cfg.fast_token_limit, context_window)
+        command_name, arguments = cmd.get_command(reply)
+        result = f"Command {command_name} returned: {arguments}"
+        memory.add_async(f"Assistant Reply: {reply} \nResult: {result} \nHuman Feedback: {user_input} ")
+        full_message_history.append(chat.create_chat_message("system", result))
+
+    print(f"{'operation':<28} {'runs':>6} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    report("agent loop step", [timed(step) for _ in range(args.steps)])
+
+    text = " ".join(f"Sentence number {i} of the page." for i in range(5000))
+    report("summarize_text", [timed(browse.summarize_text, text, "What is this?") for _ in range(3)])
+
+    key, _ = agent_manager.create_agent("benchmark", "Say hello", cfg.fast_llm_model)
+    report("message_agent", [timed(agent_manager.message_agent, key, "Again") for _ in range(args.steps)])
+
+    report("call_ai_function", [
+        timed(call_ai_function, "def add(a: int, b: int) -> int:", [1, 2], "Adds two numbers")
+        for _ in range(args.steps)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark PineconeMemory write throughput offline, against the in-process
+fake index from tests/fake_pinecone.py with a simulated request latency.
+
+Usage:
+
+    python benchmarks/pinecone_memory.py --vectors 2000 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../tests')))
+import memory.pinecone as pinecone_memory
+from config import Singleton
+from fake_pinecone import FakePinecone
+from memory.base import EMBED_DIM
+from memory.pinecone import PineconeMemory, vector_id
+
+
+def make_memory(latency, workers):
+    pinecone_memory.pinecone = FakePinecone(latency)
+    Singleton._instances.pop(PineconeMemory, None)
+    cfg = SimpleNamespace(
+        pinecone_api_key="", pinecone_region="", pinecone_namespace="benchmark",
+        pinecone_upsert_workers=workers)
+    return PineconeMemory(cfg)
+
+
+def one_request_per_vector(memory, texts, vectors):
+    """How writes were sent before buffering: one upsert per added text"""
+    for text, vector in zip(texts, vectors):
+        memory.index.upsert(vectors=[(vector_id(text), list(vector), {"raw_text": text})],
+                            namespace=memory.namespace)
+
+
+def single_adds(memory, texts, vectors):
+    for text, vector in zip(texts, vectors):
+        memory._insert([text], [vector])
+    memory.flush()
+
+
+def bulk_insert(memory, texts, vectors):
+    memory._insert(texts, vectors)
+    memory.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PineconeMemory writes against a fake index.')
+    parser.add_argument('--vectors', type=int, default=2000, help='Vectors to write')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per request')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, EMBED_DIM)).astype(np.float32)
+    texts = [f"memory {i}" for i in range(args.vectors)]
+
+    runs = [
+        ("one request per vector", one_request_per_vector, 1),
+        ("buffered single adds", single_adds, 1),
+        ("bulk insert, 1 worker", bulk_insert, 1),
+        ("bulk insert, 4 workers", bulk_insert, 4),
+        ("bulk insert, 8 workers", bulk_insert, 8),
+    ]
+    print(f"{'mode':<26} {'requests':>9} {'seconds':>9} {'vectors/sec':>12}")
+    for label, write, workers in runs:
+        memory = make_memory(args.latency, workers)
+        start = time.perf_counter()
+        write(memory, texts, vectors)
+        elapsed = time.perf_counter() - start
+        requests = len(memory.index.upsert_requests)
+        print(f"{label:<26} {requests:>9} {elapsed:>9.2f} {args.vectors / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark recall@k and query latency of the Redis memory index across
+vector index settings.
+
+Needs a local redis-stack server, for example:
+
+    docker run -d --name redis-stack-server -p 6379:6379 redis/redis-stack-server:latest
+
+Usage:
+
+    python benchmarks/redis_memory.py --rows 20000 --queries 200 --k 10
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import redis
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from config import Config
+from memory.base import EMBED_DIM
+from memory.redismem import VECTOR_DTYPES, build_knn_query, build_schema
+
+SETTINGS = [
+    {"redis_vector_algorithm": "FLAT"},
+    {"redis_vector_algorithm": "HNSW", "redis_hnsw_ef_runtime": 10},
+    {"redis_vector_algorithm": "HNSW", "redis_hnsw_ef_runtime": 50},
+    {"redis_vector_algorithm": "HNSW", "redis_hnsw_ef_runtime": 200},
+    {"redis_vector_algorithm": "HNSW", "redis_hnsw_m": 32, "redis_hnsw_ef_runtime": 50},
+    {"redis_vector_algorithm": "HNSW", "redis_hnsw_ef_runtime": 50, "redis_vector_type": "FLOAT16"},
+    {"redis_vector_algorithm": "FLAT", "redis_vector_type": "FLOAT16"},
+]
+
+
+def make_vectors(rows, queries, clusters=256, seed=0):
+    """Unit vectors drawn around random centres, loosely like text embeddings"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, EMBED_DIM)).astype(np.float32)
+    def sample(n):
+        points = centres[rng.integers(clusters, size=n)]
+        points += 0.5 * rng.standard_normal((n, EMBED_DIM)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+    return sample(rows), sample(queries)
+
+
+def exact_top_k(data, queries, k):
+    scores = np.dot(queries, data.T)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def wait_for_indexing(client, name):
+    while True:
+        info = client.ft(name).info()
+        if float(info.get("percent_indexed", 1)) >= 1:
+            return
+        time.sleep(0.1)
+
+
+def run(client, name, cfg, data, queries, truth, k):
+    prefix = f"{name}:"
+    client.ft(name).create_index(
+        fields=build_schema(cfg),
+        definition=IndexDefinition(prefix=[prefix], index_type=IndexType.HASH))
+    dtype = VECTOR_DTYPES[cfg.redis_vector_type]
+
+    start = time.perf_counter()
+    for batch_start in range(0, len(data), 1000):
+        pipe = client.pipeline(transaction=False)
+        for row in range(batch_start, min(batch_start + 1000, len(data))):
+            pipe.hset(f"{prefix}{row}", mapping={
+                "data": str(row),
+                "embedding": data[row].astype(dtype).tobytes(),
+                "created_at": 0,
+            })
+        pipe.execute()
+    wait_for_indexing(client, name)
+    build_time = time.perf_counter() - start
+
+    query = build_knn_query(cfg, k)
+    latencies = []
+    hits = 0
+    for query_vector, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = client.ft(name).search(
+            query, query_params={"vector": query_vector.astype(dtype).tobytes()})
+        latencies.append(time.perf_counter() - start)
+        found = {int(doc.id[len(prefix):]) for doc in results.docs}
+        hits += len(found & set(expected.tolist()))
+
+    client.ft(name).dropindex(delete_documents=True)
+    latencies = np.array(latencies) * 1000
+    return {
+        "build_s": build_time,
+        "recall": hits / truth.size,
+        "p50_ms": np.percentile(latencies, 50),
+        "p99_ms": np.percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Redis vector index settings.')
+    parser.add_argument('--rows', type=int, default=20000, help='Vectors to index')
+    parser.add_argument('--queries', type=int, default=200, help='Queries to time')
+    parser.add_argument('--k', type=int, default=10, help='Neighbours per query')
+    args = parser.parse_args()
+
+    cfg = Config()
+    client = redis.Redis(host=cfg.redis_host, port=cfg.redis_port, password=cfg.redis_password)
+    data, queries = make_vectors(args.rows, args.queries)
+    truth = exact_top_k(data, queries, args.k)
+
+    print(f"{'settings':<70} {'build s':>8} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for i, overrides in enumerate(SETTINGS):
+        settings = SimpleNamespace(**{**vars(cfg), **overrides})
+        result = run(client, f"benchmark-{i}", settings, data, queries, truth, args.k)
+        label = ", ".join(f"{key[len('redis_'):]}={value}" for key, value in overrides.items())
+        print(f"{label:<70} {result['build_s']:>8.2f} {result['recall']:>10.3f} "
+              f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
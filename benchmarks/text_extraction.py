@@ -0,0 +1,70 @@
+"""
+Measure how much text the main content extraction removes from pages before
+they are summarized, on the saved pages in benchmarks/fixtures (or any other
+HTML files given on the command line). tiktoken must already have its
+encodings cached.
+
+Usage:
+
+    python benchmarks/text_extraction.py
+    python benchmarks/text_extraction.py saved_page.html --show
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import browse
+import content_extractor
+import token_counter
+from bs4 import BeautifulSoup
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', '*.html')
+
+
+def all_text(soup):
+    """The page text as it was summarized before, every visible string"""
+    lines = (line.strip() for line in soup.get_text().splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the text saved by main content extraction.')
+    parser.add_argument('files', nargs='*', help='HTML files to measure, the fixtures by default')
+    parser.add_argument('--model', default='gpt-3.5-turbo', help='Model whose tokenizer counts the tokens')
+    parser.add_argument('--show', action='store_true', help='Print the extracted text of each page')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(FIXTURES))
+    print(f"{'page':<24} {'chars':>7} {'kept':>7} {'saved':>6} {'tokens':>7} {'kept':>7} {'saved':>6} {'ms':>6}")
+    totals = [0, 0, 0, 0]
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            soup = BeautifulSoup(f.read(), browse.HTML_PARSER)
+        for script in soup(["script", "style"]):
+            script.extract()
+        before = all_text(soup)
+        start = time.perf_counter()
+        after = content_extractor.extract_text(soup)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        counts = [len(before), len(after),
+                  token_counter.count_string_tokens(before, args.model),
+                  token_counter.count_string_tokens(after, args.model)]
+        totals = [total + count for total, count in zip(totals, counts)]
+        chars, kept_chars, tokens, kept_tokens = counts
+        print(f"{os.path.basename(path)[:24]:<24} {chars:>7} {kept_chars:>7} {1 - kept_chars / chars:>6.0%} "
+              f"{tokens:>7} {kept_tokens:>7} {1 - kept_tokens / tokens:>6.0%} {elapsed:>6.1f}")
+        if args.show:
+            print(after, end="\n\n")
+
+    chars, kept_chars, tokens, kept_tokens = totals
+    print(f"{'total':<24} {chars:>7} {kept_chars:>7} {1 - kept_chars / chars:>6.0%} "
+          f"{tokens:>7} {kept_tokens:>7} {1 - kept_tokens / tokens:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
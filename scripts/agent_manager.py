@@ -1,7 +1,31 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import token_counter
+from config import Config
 from llm_utils import create_chat_completion
 
+cfg = Config()
+
 next_key = 0
 agents = {}  # key, (task, full_message_history, model)
+# Keys of agents saved by earlier runs that have not been loaded yet
+saved_keys = set()
+_scanned = False
+
+# Guards agents, saved_keys and next_key. Each agent also has its own lock, so messages to
+# one agent are answered one at a time while other agents run at the same time.
+registry_lock = threading.Lock()
+agent_locks = {}
+
+_executor = None
+
+# Tokens of each agent's context kept free for its reply, and the most its summary may use
+AGENT_REPLY_TOKENS = 1000
+AGENT_SUMMARY_TOKENS = 300
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
 
 # Create new GPT agent
 # TODO: Centralise use of create_chat_completion() to globally enforce token limit
@@ -22,12 +46,16 @@ def create_agent(task, prompt, model):
     # Update full message history
     messages.append({"role": "assistant", "content": agent_reply})
 
-    key = next_key
-    # This is done instead of len(agents) to make keys unique even if agents
-    # are deleted
-    next_key += 1
+    with registry_lock:
+        _scan_saved_agents()
+        key = next_key
+        # This is done instead of len(agents) to make keys unique even if agents
+        # are deleted
+        next_key += 1
 
-    agents[key] = (task, messages, model)
+        agents[key] = (task, messages, model)
+        agent_locks[key] = threading.Lock()
+        _append_log(key, {"task": task, "model": model}, *messages)
 
     return key, agent_reply
 
@@ -36,37 +64,222 @@ def message_agent(key, message):
     """Send a message to an agent and return its response"""
     global agents
 
-    task, messages, model = agents[int(key)]
+    key = int(key)
+    with registry_lock:
+        task, messages, model = _get_agent(key)
+        lock = agent_locks[key]
 
-    # Add user message to message history before sending to agent
-    messages.append({"role": "user", "content": message})
+    with lock:
+        # Add user message to message history before sending to agent
+        user_message = {"role": "user", "content": message}
+        messages.append(user_message)
+        evicted = fit_context(messages, model)
+        if evicted:
+            _append_log(key, user_message, {"evicted": evicted, "summary": messages[1]["content"]})
+        else:
+            _append_log(key, user_message)
 
-    # Start GTP3 instance
-    agent_reply = create_chat_completion(
-        model=model,
-        messages=messages,
-    )
+        # Start GTP3 instance
+        agent_reply = create_chat_completion(
+            model=model,
+            messages=messages,
+        )
 
-    # Update full message history
-    messages.append({"role": "assistant", "content": agent_reply})
+        # Update full message history
+        messages.append({"role": "assistant", "content": agent_reply})
+        _append_log(key, messages[-1])
 
     return agent_reply
 
 
+def token_limit(model):
+    """Return the context size of the model, from the smart or fast token limit"""
+    return cfg.smart_token_limit if model == cfg.smart_llm_model else cfg.fast_token_limit
+
+
+def _message_tokens(message, model):
+    try:
+        return token_counter.count_single_message_tokens(message, model)
+    except NotImplementedError:
+        return token_counter.count_single_message_tokens(message, cfg.fast_llm_model)
+
+
+def _is_summary(message):
+    return message["role"] == "system" and message["content"].startswith(SUMMARY_PREFIX)
+
+
+def summarize_messages(summary, messages):
+    """Fold messages into the summary of the conversation before them and return the new summary"""
+    conversation = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt = (
+        "Update the summary of a conversation with the messages that follow it. "
+        "Keep the task that was given, facts, decisions, results and open questions, and leave out greetings.\n\n"
+        f"Summary:\n{summary or '(empty)'}\n\nMessages:\n{conversation}\n\nUpdated summary:"
+    )
+    return create_chat_completion(
+        model=cfg.fast_llm_model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+        max_tokens=AGENT_SUMMARY_TOKENS,
+    )
+
+
+def fit_context(messages, model):
+    """
+    Keep the agent's messages within its model's token limit, leaving room
+    for the reply. The first message, which gives the agent its identity,
+    always stays; the oldest turns after it are evicted and folded into a
+    rolling summary message that takes their place.
+
+    Returns: The number of messages replaced by the summary, 0 if none were.
+    """
+    budget = token_limit(model) - AGENT_REPLY_TOKENS
+    counts = [_message_tokens(message, model) for message in messages]
+    # Every reply is primed with 3 tokens
+    if sum(counts) + 3 <= budget:
+        return 0
+
+    start = 2 if len(messages) > 1 and _is_summary(messages[1]) else 1
+    summary = messages[1]["content"][len(SUMMARY_PREFIX):] if start == 2 else None
+    # The first message, the priming and the new summary at its largest
+    used = counts[0] + 3 + AGENT_SUMMARY_TOKENS + _message_tokens({"role": "system", "content": SUMMARY_PREFIX}, model)
+
+    # Keep the newest messages that fit, starting the window at a user message
+    end = len(messages)
+    for i in range(len(messages) - 1, start - 1, -1):
+        if used + counts[i] > budget and i < len(messages) - 1:
+            break
+        used += counts[i]
+        end = i
+    while end < len(messages) - 1 and messages[end]["role"] != "user":
+        end += 1
+    if end == start:
+        return 0
+
+    summary = summarize_messages(summary, messages[start:end])
+    messages[1:end] = [{"role": "system", "content": SUMMARY_PREFIX + summary}]
+    return end - 1
+
+
+def _log_path(key):
+    return os.path.join(cfg.agent_dir, f"{key}.jsonl")
+
+
+def _append_log(key, *records):
+    """
+    Append records to the agent's log: its task and model first, then every
+    message, and a record of the messages replaced by each new summary.
+    """
+    if not cfg.persist_agents:
+        return
+    with open(_log_path(key), "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+
+
+def _scan_saved_agents():
+    """Find the agents saved by earlier runs, once, without reading their logs"""
+    global next_key, _scanned
+    if _scanned or not cfg.persist_agents:
+        return
+    _scanned = True
+    os.makedirs(cfg.agent_dir, exist_ok=True)
+    for name in os.listdir(cfg.agent_dir):
+        stem, extension = os.path.splitext(name)
+        if extension == ".jsonl" and stem.isdigit() and int(stem) not in agents:
+            saved_keys.add(int(stem))
+    if saved_keys:
+        next_key = max(next_key, max(saved_keys) + 1)
+
+
+def _load_agent(key):
+    """Rebuild an agent from its log, and rewrite the log without the messages since summarized"""
+    with open(_log_path(key), "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    task, model = records[0]["task"], records[0]["model"]
+    messages = []
+    for record in records[1:]:
+        if "evicted" in record:
+            messages[1:record["evicted"] + 1] = [{"role": "system", "content": record["summary"]}]
+        else:
+            messages.append(record)
+
+    if len(records) > len(messages) + 1:
+        temporary_path = _log_path(key) + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in [records[0], *messages]))
+        os.replace(temporary_path, _log_path(key))
+    return task, messages, model
+
+
+def _get_agent(key):
+    """Return a loaded agent, loading it from its log on first use. Raises KeyError for unknown keys."""
+    _scan_saved_agents()
+    if key in saved_keys:
+        agents[key] = _load_agent(key)
+        agent_locks[key] = threading.Lock()
+        saved_keys.discard(key)
+    return agents[key]
+
+
+def get_executor():
+    """Return the thread pool that messages agents concurrently"""
+    global _executor
+    with registry_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=cfg.agent_workers, thread_name_prefix="agent")
+    return _executor
+
+
+def submit_message(key, message):
+    """Send a message to an agent in the background and return a future of its response"""
+    return get_executor().submit(message_agent, key, message)
+
+
+def message_agents(messages):
+    """
+    Send messages to several agents at once, so they take as long as the
+    slowest agent rather than the sum of them all.
+
+    Returns: A list of (key, response) in the order of messages, with the
+    exception instead of the response for agents that failed.
+    """
+    futures = [(key, submit_message(key, message)) for key, message in messages]
+    results = []
+    for key, future in futures:
+        try:
+            results.append((key, future.result()))
+        except Exception as e:
+            results.append((key, e))
+    return results
+
+
 def list_agents():
     """Return a list of all agents"""
     global agents
 
     # Return a list of agent keys and their tasks
-    return [(key, task) for key, (task, _, _) in agents.items()]
+    with registry_lock:
+        _scan_saved_agents()
+        tasks = {key: task for key, (task, _, _) in agents.items()}
+        # Saved agents are not loaded to list them, their task is on the first line of their log
+        for key in saved_keys:
+            with open(_log_path(key), "r", encoding="utf-8") as f:
+                tasks[key] = json.loads(f.readline())["task"]
+    return sorted(tasks.items())
 
 
 def delete_agent(key):
     """Delete an agent and return True if successful, False otherwise"""
     global agents
 
-    try:
-        del agents[int(key)]
-        return True
-    except KeyError:
-        return False
+    key = int(key)
+    with registry_lock:
+        _scan_saved_agents()
+        if key not in agents and key not in saved_keys:
+            return False
+        agents.pop(key, None)
+        agent_locks.pop(key, None)
+        saved_keys.discard(key)
+        if cfg.persist_agents and os.path.exists(_log_path(key)):
+            os.remove(_log_path(key))
+    return True
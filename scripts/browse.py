@@ -1,45 +1,96 @@
 import requests
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+import content_extractor
+import http_client
 from llm_utils import create_chat_completion
+import token_counter
 
 cfg = Config()
 
+# lxml parses pages several times faster than the built-in parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Tokens of page text per summary request, and tokens per summary
+CHUNK_TOKENS = 2000
+SUMMARY_TOKENS = 300
+
 # Define and check for local file address prefixes
 def check_local_file_access(url):
     local_prefixes = ['file:///', 'file://localhost', 'http://localhost', 'https://localhost']
     return any(url.startswith(prefix) for prefix in local_prefixes)
 
-def scrape_text(url):
-    """Scrape text from a webpage"""
-    # Most basic check if the URL is valid:
-    if not url.startswith('http'):
-        return "Error: Invalid URL"
-    
-    # Restrict access to local files
-    if check_local_file_access(url):
-        return "Error: Access to local files is restricted"
-    
-    try:
-        response = requests.get(url, headers=cfg.user_agent_header)
-    except requests.exceptions.RequestException as e:
-        return "Error: " + str(e)
-
-    # Check if the response contains an HTTP error
-    if response.status_code >= 400:
-        return "Error: HTTP " + str(response.status_code) + " error"
-
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    for script in soup(["script", "style"]):
-        script.extract()
+class WebPage:
+    """A web page downloaded and parsed once, giving both its text and its links"""
+
+    def __init__(self, url):
+        self.url = url
+        self.error = None
+        self.soup = None
+        self._text = None
+        self._links = None
+        self._fetch()
+
+    def _fetch(self):
+        # Most basic check if the URL is valid:
+        if not self.url.startswith('http'):
+            self.error = "Error: Invalid URL"
+            return
+
+        # Restrict access to local files
+        if check_local_file_access(self.url):
+            self.error = "Error: Access to local files is restricted"
+            return
+
+        try:
+            response = http_client.get(self.url)
+        except requests.exceptions.RequestException as e:
+            self.error = "Error: " + str(e)
+            return
+
+        # Check if the response contains an HTTP error
+        if response.status_code >= 400:
+            self.error = "Error: HTTP " + str(response.status_code) + " error"
+            return
+
+        self.soup = BeautifulSoup(response.text, HTML_PARSER)
+
+        for script in self.soup(["script", "style"]):
+            script.extract()
+
+    @property
+    def text(self):
+        """The main text of the page, one phrase per line, or the error message"""
+        if self.error:
+            return self.error
+        if self._text is None:
+            if cfg.extract_main_content:
+                self._text = content_extractor.extract_text(self.soup)
+            else:
+                text = self.soup.get_text()
+                lines = (line.strip() for line in text.splitlines())
+                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+                self._text = '\n'.join(chunk for chunk in chunks if chunk)
+        return self._text
+
+    @property
+    def links(self):
+        """The page's links formatted as "text (url)", or the error message"""
+        if self.error:
+            return self.error
+        if self._links is None:
+            self._links = format_hyperlinks(extract_hyperlinks(self.soup))
+        return self._links
 
-    text = soup.get_text()
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = '\n'.join(chunk for chunk in chunks if chunk)
 
-    return text
+def scrape_text(url):
+    """Scrape text from a webpage"""
+    return WebPage(url).text
 
 
 def extract_hyperlinks(soup):
@@ -60,36 +111,30 @@ def format_hyperlinks(hyperlinks):
 
 def scrape_links(url):
     """Scrape links from a webpage"""
-    response = requests.get(url, headers=cfg.user_agent_header)
-
-    # Check if the response contains an HTTP error
-    if response.status_code >= 400:
-        return "error"
-
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    for script in soup(["script", "style"]):
-        script.extract()
-
-    hyperlinks = extract_hyperlinks(soup)
+    return WebPage(url).links
 
-    return format_hyperlinks(hyperlinks)
 
-
-def split_text(text, max_length=8192):
-    """Split text into chunks of a maximum length"""
-    paragraphs = text.split("\n")
-    current_length = 0
+def split_text(text, max_tokens=CHUNK_TOKENS, model=None):
+    """Split text into chunks of at most max_tokens tokens, breaking at newlines where possible"""
+    encoding = token_counter.get_encoding(model or cfg.fast_llm_model)
     current_chunk = []
+    current_tokens = 0
 
-    for paragraph in paragraphs:
-        if current_length + len(paragraph) + 1 <= max_length:
-            current_chunk.append(paragraph)
-            current_length += len(paragraph) + 1
+    for paragraph in text.split("\n"):
+        tokens = encoding.encode(paragraph)
+        if len(tokens) < max_tokens:
+            pieces = [(paragraph, len(tokens) + 1)]
         else:
-            yield "\n".join(current_chunk)
-            current_chunk = [paragraph]
-            current_length = len(paragraph) + 1
+            # Too long for one chunk, cut it at token boundaries
+            pieces = [(encoding.decode(tokens[i:i + max_tokens - 1]), len(tokens[i:i + max_tokens - 1]) + 1)
+                      for i in range(0, len(tokens), max_tokens - 1)]
+        for piece, piece_tokens in pieces:
+            if current_chunk and current_tokens + piece_tokens > max_tokens:
+                yield "\n".join(current_chunk)
+                current_chunk = []
+                current_tokens = 0
+            current_chunk.append(piece)
+            current_tokens += piece_tokens
 
     if current_chunk:
         yield "\n".join(current_chunk)
@@ -102,6 +147,20 @@ def create_message(chunk, question):
         "content": f"\"\"\"{chunk}\"\"\" Using the above text, please answer the following question: \"{question}\" -- if the question cannot be answered using the text, please summarize the text."
     }
 
+def summarize_chunks(chunks, question):
+    """Summarize each chunk, several at a time, keeping their order"""
+    def summarize(chunk):
+        return create_chat_completion(
+            model=cfg.fast_llm_model,
+            messages=[create_message(chunk, question)],
+            temperature=0,
+            max_tokens=SUMMARY_TOKENS,
+        )
+
+    with ThreadPoolExecutor(max_workers=cfg.summary_workers) as executor:
+        return list(executor.map(summarize, chunks))
+
+
 def summarize_text(text, question):
     """Summarize text using the LLM model"""
     if not text:
@@ -110,29 +169,15 @@ def summarize_text(text, question):
     text_length = len(text)
     print(f"Text length: {text_length} characters")
 
-    summaries = []
     chunks = list(split_text(text))
-
-    for i, chunk in enumerate(chunks):
-        print(f"Summarizing chunk {i + 1} / {len(chunks)}")
-        messages = [create_message(chunk, question)]
-
-        summary = create_chat_completion(
-            model=cfg.fast_llm_model,
-            messages=messages,
-            max_tokens=300,
-        )
-        summaries.append(summary)
-
+    print(f"Summarizing {len(chunks)} chunks, {cfg.summary_workers} at a time")
+    summaries = summarize_chunks(chunks, question)
     print(f"Summarized {len(chunks)} chunks.")
 
     combined_summary = "\n".join(summaries)
-    messages = [create_message(combined_summary, question)]
-
-    final_summary = create_chat_completion(
-        model=cfg.fast_llm_model,
-        messages=messages,
-        max_tokens=300,
-    )
+    # Summarize the summaries until they fit in a single request
+    while len(summaries) > 1 and token_counter.count_string_tokens(combined_summary, cfg.fast_llm_model) > CHUNK_TOKENS:
+        summaries = summarize_chunks(list(split_text(combined_summary)), question)
+        combined_summary = "\n".join(summaries)
 
-    return final_summary
+    return summarize_chunks([combined_summary], question)[0]
@@ -1,9 +1,13 @@
 import time
-import openai
+import itertools
 from dotenv import load_dotenv
 from config import Config
 import token_counter
-from llm_utils import create_chat_completion
+from context_window import ContextWindow, trim_memories
+from json_stream import JsonStreamParser
+from llm_backends import get_completion_cache
+from llm_utils import create_chat_completion, stream_chat_completion
+from memory.base import get_embedding_cache
 
 cfg = Config()
 
@@ -21,8 +25,34 @@ def create_chat_message(role, content):
     return {"role": role, "content": content}
 
 
-def generate_context(prompt, relevant_memory, full_message_history, model):
-    current_context = [
+def get_relevant_memory(permanent_memory, full_message_history, num_relevant):
+    """
+    Query memory for several aspects of the conversation in one batched call:
+    the recent history, the last assistant reply and the last command result.
+
+    Returns:
+    list: The results of each query interleaved, best first, without duplicates.
+    """
+    queries = [str(full_message_history[-5:])]
+    for role in ("assistant", "system"):
+        last_message = next(
+            (message["content"] for message in reversed(full_message_history) if message["role"] == role),
+            None)
+        if last_message and last_message not in queries:
+            queries.append(last_message)
+
+    results = permanent_memory.get_relevant_many(queries, num_relevant)
+
+    relevant_memory = []
+    for memories in itertools.zip_longest(*[result or [] for result in results]):
+        for memory in memories:
+            if memory is not None and memory not in relevant_memory:
+                relevant_memory.append(memory)
+    return relevant_memory[:num_relevant]
+
+
+def generate_context(prompt, relevant_memory):
+    return [
         create_chat_message(
             "system", prompt),
         create_chat_message(
@@ -30,12 +60,27 @@ def generate_context(prompt, relevant_memory, full_message_history, model):
         create_chat_message(
             "system", f"This reminds you of these events from your past:\n{relevant_memory}\n\n")]
 
-    # Add messages from the full message history until we reach the token limit
-    next_message_to_add_index = len(full_message_history) - 1
-    insertion_index = len(current_context)
-    # Count the currently used tokens
-    current_tokens_used = token_counter.count_message_tokens(current_context, model)
-    return next_message_to_add_index, current_tokens_used, insertion_index, current_context
+
+def stream_reply(messages, model, max_tokens, on_member):
+    """
+    Stream the AI's reply, passing each top-level member of its JSON to
+    on_member(key, value) as soon as the member closes. Stops reading once
+    the JSON object is complete.
+
+    Returns:
+    str: The text of the reply.
+    """
+    parser = JsonStreamParser()
+    chunks = stream_chat_completion(model=model, messages=messages, max_tokens=max_tokens)
+    try:
+        for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                on_member(key, value)
+            if parser.done:
+                break
+    finally:
+        chunks.close()
+    return parser.buffer
 
 
 # TODO: Change debug from hardcode to argument
@@ -44,103 +89,100 @@ def chat_with_ai(
         user_input,
         full_message_history,
         permanent_memory,
-        token_limit):
-    """Interact with the OpenAI API, sending the prompt, user input, message history, and permanent memory."""
-    while True:
-        try:
-            """
-            Interact with the OpenAI API, sending the prompt, user input, message history, and permanent memory.
-
-            Args:
-            prompt (str): The prompt explaining the rules to the AI.
-            user_input (str): The input from the user.
-            full_message_history (list): The list of all messages sent between the user and the AI.
-            permanent_memory (Obj): The memory object containing the permanent memory.
-            token_limit (int): The maximum number of tokens allowed in the API call.
-
-            Returns:
-            str: The AI's response.
-            """
-            model = cfg.fast_llm_model # TODO: Change model from hardcode to argument
-            # Reserve 1000 tokens for the response
-            
-            if cfg.debug:
-                print(f"Token limit: {token_limit}")
-                
-            send_token_limit = token_limit - 1000
-
-            relevant_memory = permanent_memory.get_relevant(str(full_message_history[-5:]), 10)
-
-            if cfg.debug:
-                print('Memory Stats: ', permanent_memory.get_stats())
-
-            next_message_to_add_index, current_tokens_used, insertion_index, current_context = generate_context(
-                prompt, relevant_memory, full_message_history, model)
-
-            while current_tokens_used > 2500:
-                # remove memories until we are under 2500 tokens
-                relevant_memory = relevant_memory[1:]
-                next_message_to_add_index, current_tokens_used, insertion_index, current_context = generate_context(
-                    prompt, relevant_memory, full_message_history, model)
-
-            current_tokens_used += token_counter.count_message_tokens([create_chat_message("user", user_input)], model) # Account for user input (appended later)
-
-            while next_message_to_add_index >= 0:
-                # print (f"CURRENT TOKENS USED: {current_tokens_used}")
-                message_to_add = full_message_history[next_message_to_add_index]
-
-                tokens_to_add = token_counter.count_message_tokens([message_to_add], model)
-                if current_tokens_used + tokens_to_add > send_token_limit:
-                    break
-
-                # Add the most recent message to the start of the current context, after the two system prompts.
-                current_context.insert(insertion_index, full_message_history[next_message_to_add_index])
-
-                # Count the currently used tokens
-                current_tokens_used += tokens_to_add
-
-                # Move to the next most recent message in the full message history
-                next_message_to_add_index -= 1
-
-            # Append user input, the length of this is accounted for above
-            current_context.extend([create_chat_message("user", user_input)])
-
-            # Calculate remaining tokens
-            tokens_remaining = token_limit - current_tokens_used
-            # assert tokens_remaining >= 0, "Tokens remaining is negative. This should never happen, please submit a bug report at https://www.github.com/Torantulino/Auto-GPT"
-
-            # Debug print the current context
-            if cfg.debug:
-                print(f"Token limit: {token_limit}")
-                print(f"Send Token Count: {current_tokens_used}")
-                print(f"Tokens remaining for response: {tokens_remaining}")
-                print("------------ CONTEXT SENT TO AI ---------------")
-                for message in current_context:
-                    # Skip printing the prompt
-                    if message["role"] == "system" and message["content"] == prompt:
-                        continue
-                    print(
-                        f"{message['role'].capitalize()}: {message['content']}")
-                    print()
-                print("----------- END OF CONTEXT ----------------")
-
-            # TODO: use a model defined elsewhere, so that model can contain temperature and other settings we care about
-            assistant_reply = create_chat_completion(
-                model=model,
-                messages=current_context,
-                max_tokens=tokens_remaining,
-            )
-
-            # Update full message history
-            full_message_history.append(
-                create_chat_message(
-                    "user", user_input))
-            full_message_history.append(
-                create_chat_message(
-                    "assistant", assistant_reply))
-
-            return assistant_reply
-        except openai.error.RateLimitError:
-            # TODO: WHen we switch to langchain, this is built in
-            print("Error: ", "API Rate Limit Reached. Waiting 10 seconds...")
-            time.sleep(10)
+        token_limit,
+        context_window=None,
+        on_member=None):
+    """
+    Interact with the OpenAI API, sending the prompt, user input, message history, and permanent memory.
+
+    Args:
+    prompt (str): The prompt explaining the rules to the AI.
+    user_input (str): The input from the user.
+    full_message_history (list): The list of all messages sent between the user and the AI.
+    permanent_memory (Obj): The memory object containing the permanent memory.
+    token_limit (int): The maximum number of tokens allowed in the API call.
+    context_window (ContextWindow): Keeps the history tail and its token counts between calls.
+        Pass the same one on every call; a new one is built if omitted.
+    on_member (callable): If given, the reply is streamed and on_member(key, value) is
+        called with each top-level member of the reply JSON as soon as it is complete.
+
+    Returns:
+    str: The AI's response.
+    """
+    model = cfg.fast_llm_model # TODO: Change model from hardcode to argument
+    # Reserve 1000 tokens for the response
+    
+    if cfg.debug:
+        print(f"Token limit: {token_limit}")
+        
+    send_token_limit = token_limit - 1000
+
+    if context_window is None:
+        context_window = ContextWindow(model)
+    context_window.sync(full_message_history, send_token_limit)
+
+    relevant_memory = get_relevant_memory(permanent_memory, full_message_history, 10)
+
+    if cfg.debug:
+        print('Memory Stats: ', permanent_memory.get_stats())
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            print('Embedding Cache Stats: ', embedding_cache.stats())
+        completion_cache = get_completion_cache()
+        if completion_cache is not None:
+            print('Completion Cache Stats: ', completion_cache.stats())
+
+    # Keep as many memories as fit with the system prompts in 2500 tokens
+    memory_budget = 2500 - token_counter.count_message_tokens(generate_context(prompt, []), model)
+    relevant_memory = trim_memories(relevant_memory, memory_budget, model)
+    current_context = generate_context(prompt, relevant_memory)
+    current_tokens_used = token_counter.count_message_tokens(current_context, model)
+
+    current_tokens_used += token_counter.count_single_message_tokens(create_chat_message("user", user_input), model) # Account for user input (appended later)
+
+    # Add the most recent messages from the history that still fit, after the system prompts
+    history, history_tokens = context_window.messages_within(send_token_limit - current_tokens_used)
+    current_context.extend(history)
+    current_tokens_used += history_tokens
+
+    # Append user input, the length of this is accounted for above
+    current_context.extend([create_chat_message("user", user_input)])
+
+    # Calculate remaining tokens
+    tokens_remaining = token_limit - current_tokens_used
+    # assert tokens_remaining >= 0, "Tokens remaining is negative. This should never happen, please submit a bug report at https://www.github.com/Torantulino/Auto-GPT"
+
+    # Debug print the current context
+    if cfg.debug:
+        print(f"Token limit: {token_limit}")
+        print(f"Send Token Count: {current_tokens_used}")
+        print(f"Tokens remaining for response: {tokens_remaining}")
+        print("------------ CONTEXT SENT TO AI ---------------")
+        for message in current_context:
+            # Skip printing the prompt
+            if message["role"] == "system" and message["content"] == prompt:
+                continue
+            print(
+                f"{message['role'].capitalize()}: {message['content']}")
+            print()
+        print("----------- END OF CONTEXT ----------------")
+
+    # TODO: use a model defined elsewhere, so that model can contain temperature and other settings we care about
+    if on_member is None:
+        assistant_reply = create_chat_completion(
+            model=model,
+            messages=current_context,
+            max_tokens=tokens_remaining,
+        )
+    else:
+        assistant_reply = stream_reply(current_context, model, tokens_remaining, on_member)
+
+    # Update full message history
+    full_message_history.append(
+        create_chat_message(
+            "user", user_input))
+    full_message_history.append(
+        create_chat_message(
+            "assistant", assistant_reply))
+
+    return assistant_reply
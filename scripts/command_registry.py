@@ -0,0 +1,119 @@
+"""Registry of the commands the agent can run, with metadata about each."""
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+REQUIRED = object()
+
+
+class CommandError(Exception):
+    """Raised for a command called with missing or invalid arguments."""
+
+
+@dataclass
+class Arg:
+    """A command argument: the types it accepts, and its default if it is optional."""
+    types: Tuple[type, ...] = (str,)
+    default: Any = REQUIRED
+
+    def __post_init__(self):
+        if not isinstance(self.types, tuple):
+            self.types = (self.types,)
+
+    def parse(self, name: str, value: Any) -> Any:
+        if isinstance(value, self.types) and not (isinstance(value, bool) and bool not in self.types):
+            return value
+        # Models often quote numbers, accept "3" where an integer is expected
+        if int in self.types and isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        if str in self.types and isinstance(value, (int, float)):
+            return str(value)
+        expected = " or ".join(t.__name__ for t in self.types)
+        raise CommandError(f"Argument '{name}' must be {expected}, not {type(value).__name__}")
+
+
+@dataclass
+class Command:
+    """
+    A command and what the rest of Auto-GPT may need to know about it:
+    the arguments it takes, how long it may run, whether the same arguments
+    always give the same result, whether it can run alongside other
+    commands, and whether it uses long-term memory.
+
+    A timeout only stops the agent waiting: Python threads cannot be killed,
+    so the command keeps running in the background until it returns, still
+    making its HTTP and LLM requests, and its result is thrown away.
+    """
+    name: str
+    function: Callable
+    args: Dict[str, Arg] = field(default_factory=dict)
+    timeout: Optional[float] = None
+    cacheable: bool = False
+    parallel_safe: bool = False
+    needs_memory: bool = False
+
+    def parse_arguments(self, arguments: dict) -> list:
+        """Returns: The values of the declared arguments in order. Undeclared arguments are ignored."""
+        if not self.args:
+            # The prompt asks for `args: ""` on commands without arguments
+            return []
+        if not isinstance(arguments, dict):
+            raise CommandError(f"Arguments of '{self.name}' must be an object")
+        values = []
+        for name, arg in self.args.items():
+            if name in arguments:
+                values.append(arg.parse(name, arguments[name]))
+            elif arg.default is not REQUIRED:
+                values.append(arg.default)
+            else:
+                raise CommandError(f"Missing argument '{name}' for command '{self.name}'")
+        return values
+
+    def run(self, arguments: dict, memory=None) -> Any:
+        """Run the command with the arguments, giving up after its timeout."""
+        values = self.parse_arguments(arguments)
+        kwargs = {"memory": memory} if self.needs_memory else {}
+        if self.timeout is None:
+            return self.function(*values, **kwargs)
+
+        # The command keeps running in the background if it times out, see the class docstring
+        result = {}
+
+        def target():
+            try:
+                result["value"] = self.function(*values, **kwargs)
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=target, name=f"command-{self.name}", daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise CommandError(f"Command '{self.name}' timed out after {self.timeout:g} seconds")
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+
+COMMANDS: Dict[str, Command] = {}
+
+
+def command(name: str, args: Optional[Dict[str, Arg]] = None, timeout: Optional[float] = None,
+            cacheable: bool = False, parallel_safe: bool = False, needs_memory: bool = False):
+    """
+    Decorator registering a function as the command `name`. The function is
+    called with the declared arguments in order, and with `memory` as a
+    keyword argument if it needs long-term memory.
+
+    `timeout` is the number of seconds the agent waits for the result. A
+    command that takes longer is reported as timed out but is not stopped:
+    it finishes in the background and keeps using HTTP and LLM quota until
+    then, so set timeouts well above a command's normal running time.
+    """
+    def register(function):
+        COMMANDS[name] = Command(name, function, dict(args or {}), timeout, cacheable, parallel_safe, needs_memory)
+        return function
+    return register
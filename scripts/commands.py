@@ -1,10 +1,12 @@
 import browse
+import crawler
 import json
 from memory import get_memory
 import datetime
 import agent_manager as agents
 import speak
 from config import Config
+from command_registry import COMMANDS, Arg, command
 import ai_functions as ai
 from file_operations import read_file, write_to_file, append_to_file, delete_file, search_files
 from execute_code import execute_python_file
@@ -28,94 +30,85 @@ def get_command(response):
     """Parse the response and return the command name and arguments"""
     try:
         response_json = fix_and_parse_json(response)
+        return parse_command(response_json)
+    except json.decoder.JSONDecodeError:
+        return "Error:", "Invalid JSON"
+    # All other errors, return "Error: + error message"
+    except Exception as e:
+        return "Error:", str(e)
 
-        if "command" not in response_json:
-            return "Error:" , "Missing 'command' object in JSON"
 
-        command = response_json["command"]
+def parse_command(response_json):
+    """Return the command name and arguments from a parsed response"""
+    if "command" not in response_json:
+        return "Error:" , "Missing 'command' object in JSON"
 
-        if "name" not in command:
-            return "Error:", "Missing 'name' field in 'command' object"
+    command = response_json["command"]
 
-        command_name = command["name"]
+    if "name" not in command:
+        return "Error:", "Missing 'name' field in 'command' object"
 
-        # Use an empty dictionary if 'args' field is not present in 'command' object
-        arguments = command.get("args", {})
+    command_name = command["name"]
 
-        return command_name, arguments
-    except json.decoder.JSONDecodeError:
-        return "Error:", "Invalid JSON"
-    # All other errors, return "Error: + error message"
-    except Exception as e:
-        return "Error:", str(e)
+    # Use an empty dictionary if 'args' field is not present in 'command' object
+    arguments = command.get("args", {})
+
+    return command_name, arguments
 
 
 def execute_command(command_name, arguments):
     """Execute the command and return the result"""
-    memory = get_memory(cfg)
+    command = COMMANDS.get(command_name)
+    if command is None:
+        return f"Unknown command '{command_name}'. Please refer to the 'COMMANDS' list for availabe commands and only respond in the specified JSON format."
 
     try:
-        if command_name == "google":
-
-            # Check if the Google API key is set and use the official search method
-            # If the API key is not set or has only whitespaces, use the unofficial search method
-            if cfg.google_api_key and (cfg.google_api_key.strip() if cfg.google_api_key else None):
-                return google_official_search(arguments["input"])
-            else:
-                return google_search(arguments["input"])
-        elif command_name == "memory_add":
-            return memory.add(arguments["string"])
-        elif command_name == "start_agent":
-            return start_agent(
-                arguments["name"],
-                arguments["task"],
-                arguments["prompt"])
-        elif command_name == "message_agent":
-            return message_agent(arguments["key"], arguments["message"])
-        elif command_name == "list_agents":
-            return list_agents()
-        elif command_name == "delete_agent":
-            return delete_agent(arguments["key"])
-        elif command_name == "get_text_summary":
-            return get_text_summary(arguments["url"], arguments["question"])
-        elif command_name == "get_hyperlinks":
-            return get_hyperlinks(arguments["url"])
-        elif command_name == "read_file":
-            return read_file(arguments["file"])
-        elif command_name == "write_to_file":
-            return write_to_file(arguments["file"], arguments["text"])
-        elif command_name == "append_to_file":
-            return append_to_file(arguments["file"], arguments["text"])
-        elif command_name == "delete_file":
-            return delete_file(arguments["file"])
-        elif command_name == "search_files":
-            return search_files(arguments["directory"])
-        elif command_name == "browse_website":
-            return browse_website(arguments["url"], arguments["question"])
-        # TODO: Change these to take in a file rather than pasted code, if
-        # non-file is given, return instructions "Input should be a python
-        # filepath, write your code to file and try again"
-        elif command_name == "evaluate_code":
-            return ai.evaluate_code(arguments["code"])
-        elif command_name == "improve_code":
-            return ai.improve_code(arguments["suggestions"], arguments["code"])
-        elif command_name == "write_tests":
-            return ai.write_tests(arguments["code"], arguments.get("focus"))
-        elif command_name == "execute_python_file":  # Add this command
-            return execute_python_file(arguments["file"])
-        elif command_name == "generate_image":
-            return generate_image(arguments["prompt"])
-        elif command_name == "do_nothing":
-            return "No action performed."
-        elif command_name == "task_complete":
-            shutdown()
-        else:
-            return f"Unknown command '{command_name}'. Please refer to the 'COMMANDS' list for availabe commands and only respond in the specified JSON format."
+        # Only commands that use long-term memory connect to it
+        memory = get_memory(cfg) if command.needs_memory else None
+        return command.run(arguments, memory)
     # All errors, return "Error: + error message"
     except Exception as e:
         return "Error: " + str(e)
 
 
+@command("google", args={"input": Arg(str)}, timeout=60, cacheable=True, parallel_safe=True)
+def google(query):
+    """Search Google, with the official API if a key is set"""
+    # Check if the Google API key is set and use the official search method
+    # If the API key is not set or has only whitespaces, use the unofficial search method
+    if cfg.google_api_key and (cfg.google_api_key.strip() if cfg.google_api_key else None):
+        return google_official_search(query)
+    else:
+        return google_search(query)
+
+
+@command("memory_add", args={"string": Arg(str)}, needs_memory=True)
+def memory_add(string, memory):
+    """Add a string to long-term memory"""
+    return memory.add(string)
+
+
+@command("do_nothing", parallel_safe=True)
+def do_nothing():
+    """Do nothing"""
+    return "No action performed."
+
+
+command("read_file", args={"file": Arg(str)}, parallel_safe=True)(read_file)
+command("write_to_file", args={"file": Arg(str), "text": Arg(str)})(write_to_file)
+command("append_to_file", args={"file": Arg(str), "text": Arg(str)})(append_to_file)
+command("delete_file", args={"file": Arg(str)})(delete_file)
+command("search_files", args={"directory": Arg(str)}, parallel_safe=True)(search_files)
+# TODO: Change these to take in a file rather than pasted code, if
+# non-file is given, return instructions "Input should be a python
+# filepath, write your code to file and try again"
+command("evaluate_code", args={"code": Arg(str)}, parallel_safe=True)(ai.evaluate_code)
+command("improve_code", args={"suggestions": Arg((list, str)), "code": Arg(str)}, parallel_safe=True)(ai.improve_code)
+command("write_tests", args={"code": Arg(str), "focus": Arg((list, str), None)}, parallel_safe=True)(ai.write_tests)
+command("execute_python_file", args={"file": Arg(str)}, timeout=600)(execute_python_file)
+command("generate_image", args={"prompt": Arg(str)}, timeout=300, parallel_safe=True)(generate_image)
+
+
 def get_datetime():
     """Return the current date and time"""
     return "Current date and time: " + \
@@ -166,10 +159,14 @@ def google_official_search(query, num_results=8):
     # Return the list of search result URLs
     return search_results_links
 
+@command("browse_website", args={"url": Arg(str), "question": Arg(str)}, timeout=300, cacheable=True,
+         parallel_safe=True)
 def browse_website(url, question):
     """Browse a website and return the summary and links"""
-    summary = get_text_summary(url, question)
-    links = get_hyperlinks(url)
+    # Download and parse the page once for both its text and its links
+    page = browse.WebPage(url)
+    summary = get_text_summary(url, question, page)
+    links = get_hyperlinks(url, page)
 
     # Limit links to 5
     if len(links) > 5:
@@ -180,17 +177,32 @@ def browse_website(url, question):
     return result
 
 
-def get_text_summary(url, question):
-    """Return the results of a google search"""
-    text = browse.scrape_text(url)
-    summary = browse.summarize_text(text, question)
+@command("get_text_summary", args={"url": Arg(str), "question": Arg(str)}, timeout=300, cacheable=True,
+         parallel_safe=True)
+def get_text_summary(url, question, page=None):
+    """Return a summary of the page's text, answering the question if it can"""
+    page = page or browse.WebPage(url)
+    if page.error:
+        return page.error
+    summary = browse.summarize_text(page.text, question)
     return """ "Result" : """ + summary
 
 
-def get_hyperlinks(url):
-    """Return the results of a google search"""
-    link_list = browse.scrape_links(url)
-    return link_list
+@command("get_hyperlinks", args={"url": Arg(str)}, timeout=120, cacheable=True, parallel_safe=True)
+def get_hyperlinks(url, page=None):
+    """Return the links on the page"""
+    page = page or browse.WebPage(url)
+    return page.links
+
+
+@command("crawl_websites", args={"urls": Arg((list, str)), "question": Arg(str), "depth": Arg(int, 0)}, timeout=600,
+         cacheable=True, parallel_safe=True)
+def crawl_websites(urls, question, depth=0):
+    """Fetch the websites at once, following links up to depth, and return a summary of each"""
+    if isinstance(urls, str):
+        urls = [urls]
+    summaries = crawler.crawl(urls, question, depth)
+    return "\n\n".join(f"{url}: {summary}" for url, summary in summaries.items())
 
 
 def commit_memory(string):
@@ -239,12 +251,18 @@ def overwrite_memory(key, string):
         return None
 
 
+@command("task_complete", args={"reason": Arg(str, None)})
+def task_complete(reason=None):
+    shutdown()
+
+
 def shutdown():
     """Shut down the program"""
     print("Shutting down...")
     quit()
 
 
+@command("start_agent", args={"name": Arg(str), "task": Arg(str), "prompt": Arg(str)})
 def start_agent(name, task, prompt, model=cfg.fast_llm_model):
     """Start an agent with a given name, task, and prompt"""
     global cfg
@@ -269,6 +287,7 @@ def start_agent(name, task, prompt, model=cfg.fast_llm_model):
     return f"Agent {name} created with key {key}. First response: {agent_response}"
 
 
+@command("message_agent", args={"key": Arg((int, str)), "message": Arg(str)})
 def message_agent(key, message):
     """Message an agent with a given key and message"""
     global cfg
@@ -288,11 +307,31 @@ def message_agent(key, message):
     return agent_response
 
 
+@command("message_agents", args={"messages": Arg(dict)})
+def message_agents(messages):
+    """Message several agents at once, given a dict of key to message"""
+    if not isinstance(messages, dict):
+        return "Invalid messages, must be an object of agent keys to messages."
+
+    results = []
+    for key, response in agents.message_agents(messages.items()):
+        if isinstance(response, KeyError):
+            response = f"Agent {key} does not exist."
+        elif isinstance(response, Exception):
+            response = "Error: " + str(response)
+        elif cfg.speak_mode:
+            speak.say_text(response, 1)
+        results.append(f"Agent {key}: {response}")
+    return "\n\n".join(results)
+
+
+@command("list_agents", parallel_safe=True)
 def list_agents():
     """List all agents"""
     return agents.list_agents()
 
 
+@command("delete_agent", args={"key": Arg((int, str))})
 def delete_agent(key):
     """Delete an agent with a given key"""
     result = agents.delete_agent(key)
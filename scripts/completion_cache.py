@@ -0,0 +1,129 @@
+"""Disk-backed cache of deterministic chat completions."""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import token_counter
+
+# US dollars per 1000 prompt and completion tokens
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.002, 0.002),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+}
+
+
+def model_price(model: str):
+    """Returns: The (prompt, completion) price per 1000 tokens of the model, or of its base model."""
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model and model.startswith(name):
+            return MODEL_PRICES[name]
+    return (0.0, 0.0)
+
+
+def _count_tokens(messages: List[dict], response: str, model: str):
+    try:
+        prompt_tokens = token_counter.count_message_tokens(messages, model)
+    except NotImplementedError:
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+    return prompt_tokens, token_counter.count_string_tokens(response, model)
+
+
+class CompletionCache:
+    """
+    Stores chat completions in SQLite keyed by a hash of the model, messages,
+    temperature and max_tokens. Entries expire `ttl` seconds after they were
+    stored, and the least recently used are evicted once the cache holds more
+    than `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.dollars_saved = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " prompt_tokens INTEGER NOT NULL,"
+            " completion_tokens INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_last_used"
+            " ON completions (last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(messages: List[dict], model: str, temperature, max_tokens) -> str:
+        request = json.dumps([model, messages, temperature, max_tokens], sort_keys=True)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, messages: List[dict], model: str, temperature, max_tokens) -> Optional[str]:
+        """Returns: The cached response, or None on a miss."""
+        key = self.key(messages, model, temperature, max_tokens)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, prompt_tokens, completion_tokens, created_at"
+                " FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[3] > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            response, prompt_tokens, completion_tokens, _ = row
+            prompt_price, completion_price = model_price(model)
+            self.hits += 1
+            self.dollars_saved += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+        return response
+
+    def put(self, messages: List[dict], model: str, temperature, max_tokens, response: str) -> None:
+        key = self.key(messages, model, temperature, max_tokens)
+        prompt_tokens, completion_tokens = _count_tokens(messages, response, model)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response, prompt_tokens, completion_tokens, now, now),
+            )
+            self._conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+            excess = self._count() - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    " SELECT key FROM completions ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+            self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._count()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "dollars_saved": self.dollars_saved,
+        }
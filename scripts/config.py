@@ -41,10 +41,17 @@ class Config(metaclass=Singleton):
         self.smart_llm_model = os.getenv("SMART_LLM_MODEL", "gpt-4")
         self.fast_token_limit = int(os.getenv("FAST_TOKEN_LIMIT", 4000))
         self.smart_token_limit = int(os.getenv("SMART_TOKEN_LIMIT", 8000))
+        # Number of sub-agents messaged at the same time by message_agents
+        self.agent_workers = int(os.getenv("AGENT_WORKERS", 4))
+        # Save sub-agents to AGENT_DIR, one log per agent, so they survive restarts
+        self.persist_agents = os.getenv("PERSIST_AGENTS", "True") == 'True'
+        self.agent_dir = os.getenv("AGENT_DIR", 'agents')
+        # Stream replies, printing the thoughts before the command is generated
+        self.stream_responses = os.getenv("STREAM_RESPONSES", "False") == 'True'
 
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.use_azure = False
-        self.use_azure = os.getenv("USE_AZURE") == 'True'
+        self.use_azure = os.getenv("USE_AZURE") == 'True' or os.getenv("LLM_BACKEND") == 'azure'
         if self.use_azure:
             self.openai_api_base = os.getenv("OPENAI_AZURE_API_BASE")
             self.openai_api_version = os.getenv("OPENAI_AZURE_API_VERSION")
@@ -52,6 +59,22 @@ class Config(metaclass=Singleton):
             openai.api_type = "azure"
             openai.api_base = self.openai_api_base
             openai.api_version = self.openai_api_version
+        # LLM_BACKEND is openai, azure, or replay to serve recorded responses offline
+        self.llm_backend = os.getenv("LLM_BACKEND", "azure" if self.use_azure else "openai")
+        self.llm_replay_file = os.getenv("LLM_REPLAY_FILE", "llm_replay.jsonl")
+        self.llm_replay_latency = float(os.getenv("LLM_REPLAY_LATENCY", 0.0))
+        # Set to a file name to record every chat completion for later replay
+        self.llm_record_file = os.getenv("LLM_RECORD_FILE")
+        # Client-side limits applied to each model, set these to your account's quota
+        self.openai_requests_per_minute = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 3500))
+        self.openai_tokens_per_minute = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 90000))
+        self.openai_max_retries = int(os.getenv("OPENAI_MAX_RETRIES", 6))
+        # Cache completions requested with temperature 0, whose replies are deterministic
+        self.completion_cache = os.getenv("COMPLETION_CACHE", "False") == 'True'
+        self.completion_cache_path = os.getenv("COMPLETION_CACHE_PATH", 'completion_cache.sqlite3')
+        self.completion_cache_size = int(os.getenv("COMPLETION_CACHE_SIZE", 10000))
+        # Seconds before a cached completion expires, a week by default
+        self.completion_cache_ttl = float(os.getenv("COMPLETION_CACHE_TTL", 604800))
 
         self.elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
 
@@ -63,21 +86,67 @@ class Config(metaclass=Singleton):
 
         self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
         self.pinecone_region = os.getenv("PINECONE_ENV")
+        # Agents sharing a Pinecone index can keep their memories apart by namespace
+        self.pinecone_namespace = os.getenv("PINECONE_NAMESPACE", "")
+        self.pinecone_upsert_workers = int(os.getenv("PINECONE_UPSERT_WORKERS", 4))
 
         self.image_provider = os.getenv("IMAGE_PROVIDER")
         self.huggingface_api_token = os.getenv("HUGGINGFACE_API_TOKEN")
 
+        # Summarize only the main content of pages, without navigation, footers and banners
+        self.extract_main_content = os.getenv("EXTRACT_MAIN_CONTENT", "True") == 'True'
+
+        # Number of page chunks summarized at the same time when browsing
+        self.summary_workers = int(os.getenv("SUMMARY_WORKERS", 4))
+
+        # Pages downloaded at once by crawl_websites, at most per host, and pages per crawl
+        self.crawl_workers = int(os.getenv("CRAWL_WORKERS", 8))
+        self.crawl_per_host = int(os.getenv("CRAWL_PER_HOST", 2))
+        self.crawl_max_pages = int(os.getenv("CRAWL_MAX_PAGES", 10))
+
+        # Pooled connections, timeouts in seconds and largest body downloaded when browsing
+        self.http_pool_size = int(os.getenv("HTTP_POOL_SIZE", 10))
+        self.http_connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+        self.http_read_timeout = float(os.getenv("HTTP_READ_TIMEOUT", 20))
+        self.http_max_body_bytes = int(os.getenv("HTTP_MAX_BODY_BYTES", 5 * 1024 * 1024))
+        # Keep downloaded pages on disk and revalidate them instead of downloading them again
+        self.http_cache = os.getenv("HTTP_CACHE", "True") == 'True'
+        self.http_cache_path = os.getenv("HTTP_CACHE_PATH", 'http_cache.sqlite3')
+        self.http_cache_max_bytes = int(os.getenv("HTTP_CACHE_MAX_BYTES", 100 * 1024 * 1024))
+
         # User agent headers to use when browsing web
         # Some websites might just completely deny request with an error code if no user agent was found.
         self.user_agent_header = {"User-Agent":"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36"}
         self.redis_host = os.getenv("REDIS_HOST", "localhost")
         self.redis_port = os.getenv("REDIS_PORT", "6379")
         self.redis_password = os.getenv("REDIS_PASSWORD", "")
+        self.redis_pool_size = int(os.getenv("REDIS_POOL_SIZE", 10))
+        # Vector index settings, applied when the index is created.
+        # REDIS_VECTOR_ALGORITHM is HNSW or FLAT, REDIS_VECTOR_TYPE FLOAT32 or FLOAT16
+        self.redis_vector_algorithm = os.getenv("REDIS_VECTOR_ALGORITHM", "HNSW")
+        self.redis_vector_type = os.getenv("REDIS_VECTOR_TYPE", "FLOAT32")
+        self.redis_hnsw_m = int(os.getenv("REDIS_HNSW_M", 16))
+        self.redis_hnsw_ef_construction = int(os.getenv("REDIS_HNSW_EF_CONSTRUCTION", 200))
+        self.redis_hnsw_ef_runtime = int(os.getenv("REDIS_HNSW_EF_RUNTIME", 10))
+        self.redis_initial_cap = int(os.getenv("REDIS_INITIAL_CAP", 0))
         self.wipe_redis_on_start = os.getenv("WIPE_REDIS_ON_START", "True") == 'True'
+        # Set to False to keep local or Pinecone memory, e.g. after import_memory.py
+        self.wipe_memory_on_start = os.getenv("WIPE_MEMORY_ON_START", "True") == 'True'
         self.memory_index = os.getenv("MEMORY_INDEX", 'auto-gpt')
         # Note that indexes must be created on db 0 in redis, this is not configureable.
 
         self.memory_backend = os.getenv("MEMORY_BACKEND", 'local')
+        # Embeddings are cached on disk and shared by every memory backend
+        self.embedding_cache = os.getenv("EMBEDDING_CACHE", "True") == 'True'
+        self.embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH", 'embedding_cache.sqlite3')
+        self.embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", 100000))
+        # Most memory writes queued during a background write that are batched into the next one
+        self.memory_write_batch_size = int(os.getenv("MEMORY_WRITE_BATCH_SIZE", 16))
+        # Local memory search: "flat" scores every row, "ivf" only scores the
+        # rows in the NPROBE clusters closest to the query (faster, approximate)
+        self.local_memory_index_type = os.getenv("LOCAL_MEMORY_INDEX_TYPE", 'flat')
+        self.local_memory_index_nlist = int(os.getenv("LOCAL_MEMORY_INDEX_NLIST", 64))
+        self.local_memory_index_nprobe = int(os.getenv("LOCAL_MEMORY_INDEX_NPROBE", 8))
         # Initialize the OpenAI API client
         openai.api_key = self.openai_api_key
 
@@ -0,0 +1,145 @@
+"""Finds the main content of a page and drops navigation, footers and other boilerplate."""
+import re
+
+from bs4 import NavigableString, Tag
+
+# Elements that never hold the main content of a page
+BOILERPLATE_TAGS = {"nav", "footer", "aside", "form", "noscript", "iframe", "button", "select", "svg"}
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "dialog", "alertdialog", "search"}
+# Class and id names of boilerplate, unless they also look like content
+UNLIKELY_NAMES = re.compile(
+    r"advert|banner|breadcrumb|comment|consent|cookie|footer|menu|modal|nav|newsletter|"
+    r"popup|promo|related|share|sidebar|social|sponsor|subscribe|\bads?\b", re.I)
+MAYBE_NAMES = re.compile(r"article|body|column|content|main|post|story|text", re.I)
+# Elements whose text is scored and credited to their ancestors
+SCORED_TAGS = {"p", "pre", "td", "blockquote", "li"}
+# Titles next to the content are kept with it
+HEADING_TAGS = {"h1", "h2", "h3"}
+
+MIN_PARAGRAPH_CHARS = 25
+# Pages with less text than this are kept whole, there is nothing to trim
+MIN_CONTENT_CHARS = 250
+# Siblings of the best element scoring at least this fraction of it are part of the content
+SIBLING_SCORE_RATIO = 0.2
+# Numbers in relative dates and counters, which change between otherwise repeated lines
+VOLATILE_NUMBERS = re.compile(
+    r"\b\d+(?=\s*(?:second|minute|hour|day|week|month|year)s?\s+ago\b"
+    r"|\s*(?:comment|repl(?:y|ie)|like|view|share)s?\b)", re.I)
+
+
+def is_boilerplate(tag):
+    """Returns: Whether the element is navigation, a banner, hidden, or otherwise not content."""
+    if tag.name in BOILERPLATE_TAGS or tag.get("role") in BOILERPLATE_ROLES:
+        return True
+    if tag.get("aria-hidden") == "true" or tag.has_attr("hidden"):
+        return True
+    if re.search(r"display:\s*none", tag.get("style", "")):
+        return True
+    names = " ".join(tag.get("class", [])) + " " + tag.get("id", "")
+    return bool(UNLIKELY_NAMES.search(names)) and not MAYBE_NAMES.search(names) and tag.name not in ("html", "body")
+
+
+def visible_strings(node):
+    """Yields the text of the element, skipping boilerplate elements and comments"""
+    for child in node.children:
+        if isinstance(child, Tag):
+            if not is_boilerplate(child):
+                yield from visible_strings(child)
+        elif type(child) is NavigableString:
+            yield child
+
+
+def link_density(node):
+    """Returns: The fraction of the element's text that is inside links."""
+    text_length = len(node.get_text(strip=True))
+    if not text_length:
+        return 1.0
+    link_length = sum(len(link.get_text(strip=True)) for link in node.find_all("a"))
+    return link_length / text_length
+
+
+def score_candidates(root):
+    """
+    Credits the text of each paragraph-like element to its parent and half
+    to its grandparent, the way readability does.
+
+    Returns: A dict of element to score, with boilerplate elements left out.
+    """
+    scores = {}
+    for element in root.find_all(SCORED_TAGS):
+        if any(is_boilerplate(parent) for parent in [element, *element.parents] if isinstance(parent, Tag)):
+            continue
+        text = element.get_text(" ", strip=True)
+        if len(text) < MIN_PARAGRAPH_CHARS:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        parent = element.parent
+        if parent is not None:
+            scores[parent] = scores.get(parent, 0) + score
+            if parent.parent is not None:
+                scores[parent.parent] = scores.get(parent.parent, 0) + score / 2
+    return {node: score * (1 - link_density(node)) for node, score in scores.items()}
+
+
+def main_content(soup):
+    """Returns: The elements holding the page's main content, in document order."""
+    root = soup.body or soup
+    scores = score_candidates(root)
+    if not scores:
+        return [root]
+    best = max(scores, key=scores.get)
+    if best.parent is None:
+        return [best]
+
+    content = []
+    for sibling in best.parent.children:
+        if not isinstance(sibling, Tag):
+            continue
+        if sibling is best or scores.get(sibling, 0) >= scores[best] * SIBLING_SCORE_RATIO:
+            content.append(sibling)
+        elif sibling.name in HEADING_TAGS:
+            content.append(sibling)
+        elif sibling.name == "p" and len(sibling.get_text(strip=True)) > 80 and link_density(sibling) < 0.25:
+            content.append(sibling)
+    return content
+
+
+def to_lines(nodes):
+    """Returns: The visible text of the elements, one phrase per line, without blank lines."""
+    text = "\n".join("".join(visible_strings(node)) for node in nodes)
+    lines = (line.strip() for line in text.splitlines())
+    phrases = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return [phrase for phrase in phrases if phrase]
+
+
+def remove_duplicate_lines(lines):
+    """
+    Drops lines that repeat an earlier one apart from case and punctuation,
+    such as repeated "Share" links. Relative dates and counters are compared
+    without their numbers, so "Posted 3 days ago" repeats "Posted 9 days
+    ago"; other numbers are kept, so numbered steps and versions survive.
+    """
+    seen = set()
+    unique = []
+    for line in lines:
+        key = re.sub(r"[\W_]+", " ", VOLATILE_NUMBERS.sub("#", line.lower())).strip()
+        if key:
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(line)
+    return unique
+
+
+def extract_text(soup):
+    """Returns: The main content text of the page, one phrase per line."""
+    root = soup.body or soup
+    page_lines = to_lines([root])
+    if sum(len(line) for line in page_lines) < MIN_CONTENT_CHARS:
+        return "\n".join(remove_duplicate_lines(page_lines))
+
+    content_lines = to_lines(main_content(soup))
+    # Keep the whole page when the best candidate is too small to be the content
+    if sum(len(line) for line in content_lines) < MIN_CONTENT_CHARS:
+        content_lines = page_lines
+    return "\n".join(remove_duplicate_lines(content_lines))
@@ -0,0 +1,78 @@
+import itertools
+from collections import deque
+from typing import Dict, List, Tuple
+
+import token_counter
+
+
+class ContextWindow:
+    """
+    The tail of the message history that can still be sent to the model,
+    with a running token total. New history messages are counted once when
+    they are synced, and messages that can no longer fit are evicted from
+    the front, so each step only costs the messages added since the last.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.tokens = 0
+        self._messages = deque()
+        self._synced = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, message: Dict[str, str]) -> None:
+        tokens = token_counter.count_single_message_tokens(message, self.model)
+        self._messages.append((message, tokens))
+        self.tokens += tokens
+
+    def evict(self, capacity: int) -> None:
+        """Drop the oldest messages until the window holds at most `capacity` tokens."""
+        while self._messages and self.tokens > capacity:
+            _, tokens = self._messages.popleft()
+            self.tokens -= tokens
+
+    def sync(self, full_message_history: List[Dict[str, str]], capacity: int) -> None:
+        """
+        Append the history messages added since the last sync, then evict
+        down to `capacity` tokens, the most the history could ever use.
+        """
+        if len(full_message_history) < self._synced:
+            # The history was replaced, start over
+            self._messages.clear()
+            self.tokens = 0
+            self._synced = 0
+        for message in full_message_history[self._synced:]:
+            self.append(message)
+        self._synced = len(full_message_history)
+        self.evict(capacity)
+
+    def messages_within(self, token_budget: int) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Returns the most recent messages whose tokens fit in `token_budget`,
+        oldest first, and the number of tokens they use.
+        """
+        used = self.tokens
+        start = 0
+        for _, tokens in self._messages:
+            if used <= token_budget:
+                break
+            used -= tokens
+            start += 1
+        return [message for message, _ in itertools.islice(self._messages, start, None)], used
+
+
+def trim_memories(memories: List[str], token_budget: int, model: str) -> List[str]:
+    """
+    Returns the longest prefix of `memories` whose list representation fits
+    in `token_budget`, found in one pass over a running sum of per-memory
+    token counts.
+    """
+    used = 0
+    for i, memory in enumerate(memories):
+        # Each memory is shown as its repr, separated from the previous by ", "
+        used += token_counter.count_string_tokens(repr(memory), model) + (1 if i else 0)
+        if used > token_budget:
+            return memories[:i]
+    return memories
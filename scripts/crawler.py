@@ -0,0 +1,80 @@
+"""Fetches and summarizes many pages at once, optionally following their links."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urldefrag, urlparse
+
+import browse
+from config import Config
+
+cfg = Config()
+
+
+def page_links(page):
+    """Returns: The absolute http(s) URLs the page links to, without fragments."""
+    urls = []
+    for _, href in browse.extract_hyperlinks(page.soup):
+        url = urldefrag(urljoin(page.url, href))[0]
+        if urlparse(url).scheme in ("http", "https") and url not in urls:
+            urls.append(url)
+    return urls
+
+
+class Crawler:
+    """
+    Downloads pages breadth first, up to `depth` links away from the seed
+    URLs and only on the seeds' hosts. Requests go through the shared HTTP
+    session on a thread pool, with at most `per_host` at a time to each host.
+    """
+
+    def __init__(self, question, depth=0, max_pages=None, per_host=None, workers=None):
+        self.question = question
+        self.depth = depth
+        self.max_pages = max_pages or cfg.crawl_max_pages
+        self.per_host = per_host or cfg.crawl_per_host
+        self.workers = workers or cfg.crawl_workers
+        self._host_limits = {}
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def _visit(self, executor, url):
+        """Returns: (page, summary) of the URL"""
+        loop = asyncio.get_running_loop()
+        async with self._host_limit(url):
+            page = await loop.run_in_executor(executor, browse.WebPage, url)
+        if page.error:
+            return page, page.error
+        # The summary is made outside the host limit so the next download can start
+        summary = await loop.run_in_executor(executor, browse.summarize_text, page.text, self.question)
+        return page, summary
+
+    async def crawl(self, urls):
+        """Returns: A dict of URL to summary, in the order the pages were found."""
+        hosts = {urlparse(url).netloc for url in urls}
+        seen = list(dict.fromkeys(urls))[:self.max_pages]
+        results = {}
+        level = seen
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for current_depth in range(self.depth + 1):
+                visits = await asyncio.gather(*(self._visit(executor, url) for url in level))
+                next_level = []
+                for url, (page, summary) in zip(level, visits):
+                    results[url] = summary
+                    if page.error or current_depth == self.depth:
+                        continue
+                    for link in page_links(page):
+                        if urlparse(link).netloc in hosts and link not in seen and len(seen) < self.max_pages:
+                            seen.append(link)
+                            next_level.append(link)
+                if not next_level:
+                    break
+                level = next_level
+        return results
+
+
+def crawl(urls, question, depth=0):
+    """Returns: A dict of URL to the summary of its page, for the URLs and the pages they link to."""
+    return asyncio.run(Crawler(question, depth).crawl(urls))
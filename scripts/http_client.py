@@ -0,0 +1,192 @@
+"""Shared HTTP session with a disk-backed cache of downloaded pages."""
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from config import Config
+
+cfg = Config()
+
+# Response headers kept with a cached page
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control")
+READ_CHUNK_SIZE = 64 * 1024
+
+_session = None
+_page_cache = None
+_lock = threading.Lock()
+
+
+class PageCache:
+    """
+    Stores downloaded pages in SQLite keyed by URL, with the headers needed
+    to revalidate them. The least recently used pages are evicted once the
+    bodies take more than `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " headers TEXT NOT NULL,"
+            " encoding TEXT,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[dict]:
+        """Returns: The cached page as a dict of headers, encoding, body and stored_at, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT headers, encoding, body, stored_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE pages SET last_used = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+        headers, encoding, body, stored_at = row
+        return {"headers": json.loads(headers), "encoding": encoding, "body": body, "stored_at": stored_at}
+
+    def put(self, url: str, headers: dict, encoding: Optional[str], body: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, json.dumps(headers), encoding, body, len(body), now, now),
+            )
+            # Drop the least recently used pages until the rest fit
+            excess = self._size() - self.max_bytes
+            for old_url, size in self._conn.execute(
+                    "SELECT url, size FROM pages ORDER BY last_used").fetchall():
+                if excess <= 0:
+                    break
+                self._conn.execute("DELETE FROM pages WHERE url = ?", (old_url,))
+                excess -= size
+            self._conn.commit()
+
+    def revalidated(self, url: str, headers: dict) -> None:
+        """Records that the server confirmed the cached page is unchanged"""
+        with self._lock:
+            row = self._conn.execute("SELECT headers FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            merged = json.loads(row[0])
+            merged.update(headers)
+            self._conn.execute(
+                "UPDATE pages SET headers = ?, stored_at = ? WHERE url = ?",
+                (json.dumps(merged), time.time(), url),
+            )
+            self._conn.commit()
+
+    def _size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+
+def get_session():
+    """Returns: The session shared by every page download, with pooled connections."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=cfg.http_pool_size, pool_maxsize=cfg.http_pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(cfg.user_agent_header)
+            _session = session
+    return _session
+
+
+def get_page_cache():
+    """Returns: The shared page cache, or None if it is disabled."""
+    global _page_cache
+    with _lock:
+        if _page_cache is None and cfg.http_cache:
+            _page_cache = PageCache(cfg.http_cache_path, cfg.http_cache_max_bytes)
+    return _page_cache
+
+
+def _max_age(headers):
+    """Seconds the response may be reused without revalidation, or None if it must not be stored"""
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else 0
+
+
+def _kept_headers(headers) -> dict:
+    return {name: headers[name] for name in CACHED_HEADERS if name in headers}
+
+
+def _cached_response(url, page):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(page["headers"])
+    response.encoding = page["encoding"]
+    response._content = page["body"]
+    return response
+
+
+def _read_body(response):
+    """Reads at most HTTP_MAX_BODY_BYTES of the body. Returns the body and whether it was cut short."""
+    body = bytearray()
+    for chunk in response.iter_content(READ_CHUNK_SIZE):
+        body += chunk
+        if len(body) > cfg.http_max_body_bytes:
+            return bytes(body[:cfg.http_max_body_bytes]), True
+    return bytes(body), False
+
+
+def get(url):
+    """
+    Downloads a page through the shared session. A cached copy is reused
+    while fresh, and otherwise revalidated with its ETag or Last-Modified
+    date, so unchanged pages are not downloaded again.
+
+    Returns: The response. Raises requests.exceptions.RequestException on failure.
+    """
+    cache = get_page_cache()
+    page = cache.get(url) if cache is not None else None
+    headers = {}
+    if page is not None:
+        cached_headers = page["headers"]
+        if time.time() - page["stored_at"] < (_max_age(cached_headers) or 0):
+            return _cached_response(url, page)
+        if "ETag" in cached_headers:
+            headers["If-None-Match"] = cached_headers["ETag"]
+        if "Last-Modified" in cached_headers:
+            headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+
+    response = get_session().get(
+        url, headers=headers, stream=True,
+        timeout=(cfg.http_connect_timeout, cfg.http_read_timeout))
+    with response:
+        if response.status_code == 304 and page is not None:
+            cache.revalidated(url, _kept_headers(response.headers))
+            return _cached_response(url, page)
+        body, truncated = _read_body(response)
+    response._content = body
+
+    max_age = _max_age(response.headers)
+    can_revalidate = "ETag" in response.headers or "Last-Modified" in response.headers
+    if (cache is not None and response.status_code == 200 and not truncated
+            and max_age is not None and (can_revalidate or max_age > 0)):
+        cache.put(url, _kept_headers(response.headers), response.encoding, body)
+    return response
@@ -0,0 +1,55 @@
+"""Pre-seed memory with the documents in the workspace."""
+import argparse
+import time
+
+from browse import split_text
+from config import Config
+from file_operations import search_files, safe_join, working_directory
+from memory import get_memory
+
+cfg = Config()
+
+
+def iter_chunks(files, max_tokens):
+    """Yield the text chunks of every readable file, tagged with their source"""
+    for file in files:
+        try:
+            with open(safe_join(working_directory, file), "r", encoding="utf-8") as f:
+                text = f.read()
+        except (UnicodeDecodeError, OSError) as e:
+            print(f"Skipping {file}: {e}")
+            continue
+        for i, chunk in enumerate(split_text(text, max_tokens)):
+            if chunk.strip():
+                yield f"Document: {file} (part {i + 1})\n{chunk}"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description=f"Chunk the files in '{working_directory}' and add them to memory.")
+    parser.add_argument('--dir', default="", help='Directory within the workspace to import')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Maximum tokens per chunk')
+    parser.add_argument('--batch-size', type=int, default=100, help='Chunks per embeddings request')
+    parser.add_argument('--workers', type=int, default=4, help='Embeddings requests in flight at once')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    files = search_files(args.dir)
+    memory = get_memory(cfg)
+    print(f"Importing {len(files)} files into memory of type: {memory.__class__.__name__}")
+
+    start = time.perf_counter()
+    added = memory.bulk_add(
+        iter_chunks(files, args.chunk_size),
+        batch_size=args.batch_size,
+        workers=args.workers)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    print(f"Added {added} chunks of {len(files)} files in {elapsed:.2f}s "
+          f"({len(files) / elapsed:.1f} docs/sec, {added / elapsed:.1f} chunks/sec)")
+
+
+if __name__ == "__main__":
+    main()
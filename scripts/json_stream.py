@@ -0,0 +1,81 @@
+import json
+from typing import Any, List, Tuple
+
+
+class JsonStreamParser:
+    """
+    Incrementally parses a JSON object as it is streamed in. Each top-level
+    member is returned as soon as its value closes, without waiting for the
+    rest of the object. Text before the opening brace is ignored, and so are
+    braces in it: `done` is only set once a whole object parses as JSON.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+        self._object_start = None
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Adds streamed text and returns the (key, value) members it completed.
+        Members that are not valid JSON on their own are skipped; the caller
+        still has the full text in `buffer` to fall back on.
+        """
+        self.buffer += text
+        members = []
+        while self._pos < len(self.buffer) and not self.done:
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = self._pos + 1
+                    self._object_start = self._pos
+            elif char in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 1:
+                    # A nested value closed, so the member is complete
+                    self._emit(self._pos + 1, members)
+                elif self._depth == 0:
+                    self._emit(self._pos, members)
+                    # Braces in leading prose close too, keep looking for the reply
+                    self.done = self._is_object(self.buffer[self._object_start:self._pos + 1])
+            elif char == "," and self._depth == 1:
+                self._emit(self._pos, members)
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return members
+
+    @staticmethod
+    def _is_object(text: str) -> bool:
+        try:
+            return isinstance(json.loads(text, strict=False), dict)
+        except json.JSONDecodeError:
+            return False
+
+    def _emit(self, end: int, members: List[Tuple[str, Any]]) -> None:
+        if self._member_start is None:
+            return
+        member = self.buffer[self._member_start:end]
+        self._member_start = None
+        if not member.strip():
+            return
+        try:
+            parsed = json.loads("{" + member + "}", strict=False)
+        except json.JSONDecodeError:
+            return
+        members.extend(parsed.items())
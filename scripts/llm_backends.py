@@ -0,0 +1,295 @@
+"""Backends that serve chat completions and embeddings."""
+import abc
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Iterator, List
+
+import numpy as np
+import openai
+
+import token_counter
+from completion_cache import CompletionCache
+from config import Config
+from rate_limiter import RateLimiter, estimate_chat_tokens
+
+# Dimension of the embeddings made up by the replay backend, per model
+EMBEDDING_DIMENSIONS = {"text-embedding-ada-002": 1536}
+
+# Served by the replay backend when it has nothing recorded
+DEFAULT_REPLY = json.dumps({
+    "thoughts": {
+        "text": "Replaying without recorded responses.",
+        "reasoning": "No recording was found.",
+        "plan": "- do nothing",
+        "criticism": "",
+        "speak": "Nothing to do."
+    },
+    "command": {"name": "do_nothing", "args": {}}
+})
+
+_backend = None
+_completion_cache = None
+
+
+class LLMBackend(abc.ABC):
+    # Prefix for embedding cache keys, so made-up embeddings never mix with real ones
+    cache_prefix = ""
+
+    @abc.abstractmethod
+    def create_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> str:
+        pass
+
+    @abc.abstractmethod
+    def stream_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> Iterator[str]:
+        pass
+
+    @abc.abstractmethod
+    def create_embeddings(self, texts, model) -> List[List[float]]:
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    def _engine_args(self):
+        return {}
+
+    def create_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> str:
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **self._engine_args()
+        )
+        return response.choices[0].message["content"]
+
+    def stream_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> Iterator[str]:
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **self._engine_args()
+        )
+        for chunk in response:
+            content = chunk.choices[0].delta.get("content")
+            if content:
+                yield content
+
+    def create_embeddings(self, texts, model) -> List[List[float]]:
+        data = openai.Embedding.create(input=texts, model=model)["data"]
+        return [item["embedding"] for item in sorted(data, key=lambda item: item["index"])]
+
+
+class AzureBackend(OpenAIBackend):
+    """OpenAI models deployed on Azure, configured by the OPENAI_AZURE_* settings"""
+
+    def __init__(self, cfg):
+        self.deployment_id = cfg.openai_deployment_id
+
+    def _engine_args(self):
+        return {"deployment_id": self.deployment_id}
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves recorded chat completions offline, for tests and benchmarks.
+
+    Recordings are JSON lines of {"messages": [...], "response": "..."}, as
+    written by RecordingBackend. A request for exactly the recorded messages
+    gets its recorded response; any other request gets the next recorded
+    response in order, cycling. Every call waits `latency` seconds, and
+    embeddings are pseudo-random unit vectors derived from the text.
+    """
+    cache_prefix = "replay:"
+
+    def __init__(self, path, latency=0.0):
+        self.latency = latency
+        self.responses = {}
+        recorded = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.responses[_messages_key(record["messages"])] = record["response"]
+                        recorded.append(record["response"])
+        self._next = itertools.cycle(recorded or [DEFAULT_REPLY])
+        self._lock = threading.Lock()
+
+    def _respond(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        response = self.responses.get(_messages_key(messages))
+        if response is None:
+            with self._lock:
+                response = next(self._next)
+        return response
+
+    def create_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> str:
+        return self._respond(messages)
+
+    def stream_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> Iterator[str]:
+        response = self._respond(messages)
+        # Roughly one token per chunk, like the real stream
+        for i in range(0, len(response), 4):
+            yield response[i:i + 4]
+
+    def create_embeddings(self, texts, model) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        dimension = EMBEDDING_DIMENSIONS.get(model, 1536)
+        embeddings = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(dimension)
+            embeddings.append((vector / np.linalg.norm(vector)).tolist())
+        return embeddings
+
+
+class RecordingBackend(LLMBackend):
+    """Passes calls through to another backend, appending each chat completion to a replay file"""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.cache_prefix = backend.cache_prefix
+        self._lock = threading.Lock()
+
+    def _record(self, messages, response):
+        line = json.dumps({"messages": messages, "response": response})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def create_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> str:
+        response = self.backend.create_chat_completion(messages, model, temperature, max_tokens)
+        self._record(messages, response)
+        return response
+
+    def stream_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> Iterator[str]:
+        chunks = []
+        try:
+            for chunk in self.backend.stream_chat_completion(messages, model, temperature, max_tokens):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # Also record replies whose reader stopped early
+            self._record(messages, "".join(chunks))
+
+    def create_embeddings(self, texts, model) -> List[List[float]]:
+        return self.backend.create_embeddings(texts, model)
+
+
+class RateLimitedBackend(LLMBackend):
+    """Passes calls through to another backend, keeping each model within its own rate limits"""
+
+    def __init__(self, backend, cfg):
+        self.backend = backend
+        self.cache_prefix = backend.cache_prefix
+        self.requests_per_minute = cfg.openai_requests_per_minute
+        self.tokens_per_minute = cfg.openai_tokens_per_minute
+        self.max_retries = cfg.openai_max_retries
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model):
+        """Returns: The rate limiter for the model, created on first use."""
+        with self._lock:
+            if model not in self._limiters:
+                self._limiters[model] = RateLimiter(
+                    self.requests_per_minute, self.tokens_per_minute, self.max_retries)
+            return self._limiters[model]
+
+    def create_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> str:
+        return self.limiter(model).call(
+            lambda: self.backend.create_chat_completion(messages, model, temperature, max_tokens),
+            estimate_chat_tokens(messages, model, max_tokens))
+
+    def stream_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> Iterator[str]:
+        return self.limiter(model).stream(
+            lambda: iter(self.backend.stream_chat_completion(messages, model, temperature, max_tokens)),
+            estimate_chat_tokens(messages, model, max_tokens))
+
+    def create_embeddings(self, texts, model) -> List[List[float]]:
+        tokens = sum(token_counter.count_string_tokens(text, model) for text in texts)
+        return self.limiter(model).call(lambda: self.backend.create_embeddings(texts, model), tokens)
+
+
+class CachedBackend(LLMBackend):
+    """
+    Passes calls through to another backend, answering deterministic
+    (temperature=0) chat completions from a CompletionCache when it can
+    """
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.cache_prefix = backend.cache_prefix
+
+    def create_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> str:
+        if temperature != 0:
+            return self.backend.create_chat_completion(messages, model, temperature, max_tokens)
+        response = self.cache.get(messages, self.cache_prefix + model, temperature, max_tokens)
+        if response is None:
+            response = self.backend.create_chat_completion(messages, model, temperature, max_tokens)
+            self.cache.put(messages, self.cache_prefix + model, temperature, max_tokens, response)
+        return response
+
+    def stream_chat_completion(self, messages, model=None, temperature=None, max_tokens=None) -> Iterator[str]:
+        if temperature != 0:
+            yield from self.backend.stream_chat_completion(messages, model, temperature, max_tokens)
+            return
+        response = self.cache.get(messages, self.cache_prefix + model, temperature, max_tokens)
+        if response is not None:
+            yield response
+            return
+        chunks = []
+        for chunk in self.backend.stream_chat_completion(messages, model, temperature, max_tokens):
+            chunks.append(chunk)
+            yield chunk
+        # Only reached if the whole reply was read
+        self.cache.put(messages, self.cache_prefix + model, temperature, max_tokens, "".join(chunks))
+
+    def create_embeddings(self, texts, model) -> List[List[float]]:
+        return self.backend.create_embeddings(texts, model)
+
+
+def _messages_key(messages):
+    return json.dumps(messages, sort_keys=True)
+
+
+def get_completion_cache():
+    """Returns: The shared completion cache, or None if it is disabled."""
+    global _completion_cache
+    cfg = Config()
+    if _completion_cache is None and cfg.completion_cache:
+        _completion_cache = CompletionCache(
+            cfg.completion_cache_path, cfg.completion_cache_size, cfg.completion_cache_ttl
+        )
+    return _completion_cache
+
+
+def get_llm_backend():
+    """Returns: The backend selected by LLM_BACKEND, created on first use."""
+    global _backend
+    if _backend is None:
+        cfg = Config()
+        if cfg.llm_backend == "replay":
+            backend = ReplayBackend(cfg.llm_replay_file, cfg.llm_replay_latency)
+        elif cfg.llm_backend == "azure":
+            backend = AzureBackend(cfg)
+        else:
+            backend = OpenAIBackend()
+        if cfg.llm_record_file:
+            backend = RecordingBackend(backend, cfg.llm_record_file)
+        backend = RateLimitedBackend(backend, cfg)
+        # Cache hits skip the rate limits
+        cache = get_completion_cache()
+        if cache is not None:
+            backend = CachedBackend(backend, cache)
+        _backend = backend
+    return _backend
@@ -1,26 +1,26 @@
 import openai
 from config import Config
+from llm_backends import get_llm_backend
 cfg = Config()
 
 openai.api_key = cfg.openai_api_key
 
 # Overly simple abstraction until we create something better
 def create_chat_completion(messages, model=None, temperature=None, max_tokens=None)->str:
-    """Create a chat completion using the OpenAI API"""
-    if cfg.use_azure:
-        response = openai.ChatCompletion.create(
-            deployment_id=cfg.openai_deployment_id,
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
-    else:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
+    """Create a chat completion using the configured LLM backend"""
+    return get_llm_backend().create_chat_completion(
+        messages=messages,
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
 
-    return response.choices[0].message["content"]
+
+def stream_chat_completion(messages, model=None, temperature=None, max_tokens=None):
+    """Create a chat completion using the configured LLM backend, yielding the content as it is generated"""
+    return get_llm_backend().stream_chat_completion(
+        messages=messages,
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
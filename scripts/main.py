@@ -5,6 +5,8 @@ import utils
 from memory import get_memory
 import data
 import chat
+from context_window import ContextWindow
+from rate_limiter import PRIORITY_HIGH, request_priority
 from colorama import Fore, Style
 from spinner import Spinner
 import time
@@ -69,13 +71,14 @@ def print_to_console(
     print()
 
 
-def print_assistant_thoughts(assistant_reply):
-    """Prints the assistant's thoughts to the console"""
+def print_assistant_thoughts(assistant_reply, assistant_reply_json=None):
+    """Prints the assistant's thoughts to the console, parsing the reply unless it is already parsed"""
     global ai_name
     global cfg
     try:
-        # Parse and print Assistant response
-        assistant_reply_json = fix_and_parse_json(assistant_reply)
+        if assistant_reply_json is None:
+            # Parse and print Assistant response
+            assistant_reply_json = fix_and_parse_json(assistant_reply)
 
         # Check if assistant_reply_json is a string and attempt to parse it into a JSON object
         if isinstance(assistant_reply_json, str):
@@ -313,33 +316,51 @@ prompt = construct_prompt()
 # print(prompt)
 # Initialize variables
 full_message_history = []
+context_window = ContextWindow(cfg.fast_llm_model)
 result = None
 next_action_count = 0
 # Make a constant:
 user_input = "Determine which next command to use, and respond using the format specified above:"
 
-# Initialize memory and make sure it is empty.
+# Initialize memory and make sure it is empty, unless it was pre-seeded.
 # this is particularly important for indexing and referencing pinecone memory
-memory = get_memory(cfg, init=True)
+memory = get_memory(cfg, init=cfg.wipe_memory_on_start)
 print('Using memory of type: ' + memory.__class__.__name__)
 
 # Interaction Loop
 while True:
     # Send message to AI, get response
-    with Spinner("Thinking... "):
+    spinner = Spinner("Thinking... ")
+    streamed_reply = {}
+
+    def on_reply_member(key, value):
+        """Print the thoughts while the command is still being generated"""
+        streamed_reply[key] = value
+        if key == "thoughts":
+            spinner.stop()
+            print_assistant_thoughts(None, {"thoughts": value})
+
+    # The agent's own step goes ahead of background LLM requests
+    with spinner, request_priority(PRIORITY_HIGH):
         assistant_reply = chat.chat_with_ai(
             prompt,
             user_input,
             full_message_history,
             memory,
-            cfg.fast_token_limit) # TODO: This hardcodes the model to use GPT3.5. Make this an argument
+            cfg.fast_token_limit, # TODO: This hardcodes the model to use GPT3.5. Make this an argument
+            context_window,
+            on_reply_member if cfg.stream_responses else None)
 
-    # Print Assistant thoughts
-    print_assistant_thoughts(assistant_reply)
+    # Print Assistant thoughts, unless they were streamed
+    if "thoughts" not in streamed_reply:
+        print_assistant_thoughts(assistant_reply)
 
     # Get command name and arguments
     try:
-        command_name, arguments = cmd.get_command(assistant_reply)
+        if "command" in streamed_reply:
+            command_name, arguments = cmd.parse_command(streamed_reply)
+        else:
+            command_name, arguments = cmd.get_command(assistant_reply)
     except Exception as e:
         print_to_console("Error: \n", Fore.RED, str(e))
 
@@ -405,7 +426,8 @@ while True:
                     f"\nResult: {result} " \
                     f"\nHuman Feedback: {user_input} "
 
-    memory.add(memory_to_add)
+    # Embedded and written in the background; visible before the next query
+    memory.add_async(memory_to_add)
 
     # Check if there's a result from the command append it to the message
     # history
@@ -0,0 +1,210 @@
+"""Nearest-neighbour indexes over the rows of a SegmentStore."""
+import os
+from array import array
+from typing import List
+
+import numpy as np
+
+from memory.segments import SegmentStore
+
+
+# Rows per cluster needed before the IVF index is trained
+TRAIN_ROWS_PER_LIST = 32
+# Upper bound on the rows sampled per cluster when running k-means
+SAMPLE_ROWS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+# Retrain once the store has grown by this factor since the last training
+RETRAIN_GROWTH = 4
+# Rows assigned to clusters per matrix product, to bound memory use
+ASSIGN_BATCH = 8192
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Select the k highest scores along the last axis with a partial sort.
+
+    Returns: Their indices, best first.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k < n:
+        indices = np.argpartition(scores, n - k, axis=-1)[..., n - k:]
+    else:
+        indices = np.broadcast_to(np.arange(n), scores.shape)
+    order = np.argsort(np.take_along_axis(scores, indices, axis=-1), axis=-1)
+    return np.take_along_axis(indices, order[..., ::-1], axis=-1)
+
+
+class FlatIndex:
+    """Exact search: scores every stored embedding against the query."""
+
+    def __init__(self, store: SegmentStore) -> None:
+        self.store = store
+
+    def add(self, start: int, vectors: np.ndarray) -> None:
+        pass
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        """
+        Args:
+            query: The query embedding.
+            k: The number of rows to return.
+
+        Returns: The row numbers of the k best matches, best first.
+        """
+        return self.search_many(query[np.newaxis, :], k)[0]
+
+    def search_many(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        """
+        Args:
+            queries: A (num_queries, dim) matrix of query embeddings.
+            k: The number of rows to return per query.
+
+        Returns: For each query, the row numbers of its k best matches.
+        """
+        scores = np.concatenate(
+            [np.dot(queries, block.T) for block in self.store.embedding_blocks()],
+            axis=1,
+        )
+        return list(top_k(scores, k))
+
+    def clear(self) -> None:
+        pass
+
+
+class IVFIndex(FlatIndex):
+    """
+    Inverted-file index. Embeddings are clustered around `nlist` k-means
+    centroids and a query only scores the rows of its `nprobe` closest
+    clusters, so raising `nprobe` trades latency for recall. Until enough
+    rows exist to train the centroids, searches fall back to exact scoring.
+
+    The centroids, the number of rows they were trained on and the cluster
+    of every row are persisted in the store directory; cluster assignments
+    are appended as rows are added.
+    """
+
+    def __init__(self, store: SegmentStore, nlist: int, nprobe: int) -> None:
+        super().__init__(store)
+        self.nlist = nlist
+        self.nprobe = min(nprobe, nlist)
+        self.centroids_path = os.path.join(store.dirname, "ivf.centroids.npz")
+        self.assignments_path = os.path.join(store.dirname, "ivf.assignments")
+        self.centroids = None
+        self.trained_rows = 0
+        self.lists = []
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.centroids_path):
+            return
+        with np.load(self.centroids_path) as saved:
+            self.centroids = saved["centroids"]
+            self.trained_rows = int(saved["trained_rows"])
+        assignments = np.fromfile(self.assignments_path, dtype=np.int32)
+        rows = len(self.store)
+        if len(assignments) > rows:
+            assignments = assignments[:rows]
+            os.truncate(self.assignments_path, assignments.nbytes)
+        self.lists = [array("q") for _ in range(len(self.centroids))]
+        self._extend_lists(0, assignments)
+        # Catch up on rows written without updating the index.
+        if len(assignments) < rows:
+            missing = np.arange(len(assignments), rows)
+            self._assign(len(assignments), self.store.read_embeddings(missing))
+
+    def _extend_lists(self, start: int, assignments: np.ndarray) -> None:
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self.lists) + 1))
+        for cluster, rows in enumerate(self.lists):
+            rows.extend((order[bounds[cluster]:bounds[cluster + 1]] + start).tolist())
+
+    def _assign(self, start: int, vectors: np.ndarray) -> None:
+        """Assign rows to their closest centroid and record the choice."""
+        assignments = np.concatenate([
+            np.argmax(np.dot(vectors[i:i + ASSIGN_BATCH], self.centroids.T), axis=1)
+            for i in range(0, len(vectors), ASSIGN_BATCH)
+        ]).astype(np.int32)
+        self._extend_lists(start, assignments)
+        with open(self.assignments_path, "ab") as f:
+            f.write(assignments.tobytes())
+
+    def train(self) -> None:
+        """
+        Run spherical k-means over a sample of the stored embeddings and
+        reassign every row to the new centroids.
+        """
+        rows = len(self.store)
+        rng = np.random.default_rng(0)
+        sample_size = min(rows, self.nlist * SAMPLE_ROWS_PER_LIST)
+        sample = self.store.read_embeddings(
+            np.sort(rng.choice(rows, sample_size, replace=False))
+        )
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(np.dot(sample, centroids.T), axis=1)
+            for cluster in range(self.nlist):
+                members = sample[labels == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids /= np.maximum(norms, 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        np.savez(self.centroids_path, centroids=self.centroids, trained_rows=rows)
+        open(self.assignments_path, "wb").close()
+        self.lists = [array("q") for _ in range(self.nlist)]
+        for start in range(0, rows, ASSIGN_BATCH):
+            stop = min(start + ASSIGN_BATCH, rows)
+            self._assign(start, self.store.read_embeddings(np.arange(start, stop)))
+        self.trained_rows = rows
+
+    def add(self, start: int, vectors: np.ndarray) -> None:
+        rows = start + len(vectors)
+        if self.centroids is None:
+            if rows >= self.nlist * TRAIN_ROWS_PER_LIST:
+                self.train()
+        elif rows >= self.trained_rows * RETRAIN_GROWTH:
+            self.train()
+        else:
+            self._assign(start, vectors)
+
+    def search_many(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        if self.centroids is None:
+            return super().search_many(queries, k)
+        probes = top_k(np.dot(queries, self.centroids.T), self.nprobe)
+        # Gather the union of every query's candidates once and score them
+        # all with one product, masking out rows outside a query's clusters.
+        cluster_rows = {
+            cluster: np.frombuffer(self.lists[cluster], dtype=np.int64)
+            for cluster in np.unique(probes).tolist()
+        }
+        candidates = np.unique(np.concatenate(list(cluster_rows.values())))
+        scores = np.dot(queries, self.store.read_embeddings(candidates).T)
+        for i, probe in enumerate(probes):
+            own = np.concatenate([cluster_rows[cluster] for cluster in probe.tolist()])
+            mask = np.ones(len(candidates), dtype=bool)
+            mask[np.searchsorted(candidates, own)] = False
+            scores[i, mask] = -np.inf
+
+        results = []
+        for row_scores, best in zip(scores, top_k(scores, k)):
+            results.append(candidates[best[np.isfinite(row_scores[best])]])
+        return results
+
+    def clear(self) -> None:
+        for path in (self.centroids_path, self.assignments_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.centroids = None
+        self.trained_rows = 0
+        self.lists = []
+
+
+def create_index(cfg, store: SegmentStore) -> FlatIndex:
+    """Create the nearest-neighbour index selected by the config."""
+    if cfg.local_memory_index_type == "ivf":
+        return IVFIndex(
+            store, cfg.local_memory_index_nlist, cfg.local_memory_index_nprobe
+        )
+    return FlatIndex(store)
@@ -1,19 +1,147 @@
 """Base class for memory providers."""
 import abc
-from config import AbstractSingleton
-import openai
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import AbstractSingleton, Config
+from llm_backends import get_llm_backend
+from memory.embedding_cache import EmbeddingCache
+from memory.write_behind import WriteBehindQueue
+from rate_limiter import PRIORITY_LOW, request_priority
+
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBED_DIM = 1536
+_embedding_cache = None
+
+
+def get_embedding_cache():
+    """Returns: The shared embedding cache, or None if it is disabled."""
+    global _embedding_cache
+    cfg = Config()
+    if _embedding_cache is None and cfg.embedding_cache:
+        _embedding_cache = EmbeddingCache(
+            cfg.embedding_cache_path, cfg.embedding_cache_size
+        )
+    return _embedding_cache
 
 
 def get_ada_embedding(text):
-    text = text.replace("\n", " ")
-    return openai.Embedding.create(input=[text], model="text-embedding-ada-002")["data"][0]["embedding"]
+    return get_ada_embeddings([text])[0]
+
+
+def get_ada_embeddings(texts):
+    """
+    Embed several texts, preserving their order. Cached embeddings are reused
+    and the rest are fetched with a single API request.
+    """
+    texts = [text.replace("\n", " ") for text in texts]
+    cache = get_embedding_cache()
+    if cache is None:
+        return create_embeddings(texts)
+
+    cache_model = get_llm_backend().cache_prefix + EMBEDDING_MODEL
+    embeddings = cache.get_many(texts, cache_model)
+    missing = list(dict.fromkeys(
+        text for text, embedding in zip(texts, embeddings) if embedding is None
+    ))
+    if missing:
+        created = dict(zip(missing, create_embeddings(missing)))
+        cache.put_many(missing, cache_model, [created[text] for text in missing])
+        embeddings = [
+            created[text] if embedding is None else embedding
+            for text, embedding in zip(texts, embeddings)
+        ]
+    return embeddings
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def create_embeddings(texts):
+    return get_llm_backend().create_embeddings(texts, EMBEDDING_MODEL)
+
+
+def _embed_in_background(texts):
+    """Embeds texts behind the agent's more urgent requests when the API quota is short"""
+    with request_priority(PRIORITY_LOW):
+        return get_ada_embeddings(texts)
 
 
 class MemoryProviderSingleton(AbstractSingleton):
+    _write_queue = None
+
     @abc.abstractmethod
     def add(self, data):
         pass
 
+    def add_async(self, data):
+        """
+        Queues data to be embedded and added in the background, starting at
+        once unless a write is in progress. Readers call flush() first, so
+        the data is visible to the next query.
+
+        Args:
+            data: The data to add.
+        """
+        if 'Command Error:' in data:
+            return
+        if self._write_queue is None:
+            cfg = Config()
+            self._write_queue = WriteBehindQueue(self._add_batch, cfg.memory_write_batch_size)
+        self._write_queue.put(data)
+
+    def flush(self):
+        """Blocks until every queued write has been added."""
+        if self._write_queue is not None:
+            self._write_queue.flush()
+
+    def bulk_add(self, texts, batch_size=100, workers=4):
+        """
+        Adds many texts at once. Texts are embedded in batches by a pool of
+        worker threads and each batch is written with a single _insert call.
+
+        Args:
+            texts: An iterable of texts to add.
+            batch_size: The number of texts per embeddings request and write.
+            workers: The number of embeddings requests in flight at once.
+
+        Returns: The number of texts added.
+        """
+        self.flush()
+        added = 0
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch in _batched(texts, batch_size):
+                pending.append((batch, executor.submit(_embed_in_background, batch)))
+                # Bound the number of embedded batches held in memory
+                if len(pending) > 2 * workers:
+                    batch, future = pending.popleft()
+                    self._insert(batch, future.result())
+                    added += len(batch)
+            while pending:
+                batch, future = pending.popleft()
+                self._insert(batch, future.result())
+                added += len(batch)
+        return added
+
+    def _add_batch(self, texts):
+        self._insert(texts, _embed_in_background(texts))
+
+    @abc.abstractmethod
+    def _insert(self, texts, embeddings):
+        """
+        Stores texts whose embeddings have already been computed.
+
+        Args:
+            texts: The texts to store.
+            embeddings: One embedding per text.
+        """
+        pass
+
     @abc.abstractmethod
     def get(self, data):
         pass
@@ -24,8 +152,26 @@ class MemoryProviderSingleton(AbstractSingleton):
 
     @abc.abstractmethod
     def get_relevant(self, data, num_relevant=5):
+        """
+        Finds the stored data most similar to `data`.
+
+        Returns: Up to num_relevant stored data, best first. Every provider
+        keeps this order, so callers can trim the list from the end.
+        """
         pass
 
+    def get_relevant_many(self, texts, num_relevant=5):
+        """
+        Runs several relevance queries at once.
+
+        Args:
+            texts: The texts to compare to.
+            num_relevant: The number of relevant data to return per query.
+
+        Returns: One list of relevant data per text, in the same order, each best first.
+        """
+        return [self.get_relevant(text, num_relevant) for text in texts]
+
     @abc.abstractmethod
     def get_stats(self):
         pass
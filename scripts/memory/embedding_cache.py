@@ -0,0 +1,106 @@
+"""Disk-backed, content-addressed cache of text embeddings."""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Stores embeddings in SQLite keyed by a hash of the model name and the
+    whitespace-normalized text. Entries are evicted least recently used
+    first once the cache holds more than `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " embedding BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used"
+            " ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """
+        Look up several texts at once.
+
+        Returns: The cached embedding of each text, or None on a miss.
+        """
+        keys = [self.key(text, model) for text in texts]
+        with self._lock:
+            found = {}
+            for key in set(keys):
+                row = self._conn.execute(
+                    "SELECT embedding FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+            embeddings = [found.get(key) for key in keys]
+            hits = sum(embedding is not None for embedding in embeddings)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return embeddings
+
+    def put_many(
+        self,
+        texts: List[str],
+        model: str,
+        embeddings: List[List[float]]
+    ) -> None:
+        now = time.time()
+        rows = [
+            (self.key(text, model), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows
+            )
+            excess = self._count() - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+            self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._count()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
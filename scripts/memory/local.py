@@ -3,11 +3,9 @@ import orjson
 from typing import Any, List, Optional
 import numpy as np
 import os
-from memory.base import MemoryProviderSingleton, get_ada_embedding
-
-
-EMBED_DIM = 1536
-SAVE_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SERIALIZE_DATACLASS
+from memory.base import EMBED_DIM, MemoryProviderSingleton, get_ada_embedding, get_ada_embeddings
+from memory.segments import SegmentStore
+from memory.ann import create_index
 
 
 def create_default_embeddings():
@@ -27,12 +25,24 @@ class LocalCache(MemoryProviderSingleton):
     # on load, load our database
     def __init__(self, cfg) -> None:
         self.filename = f"{cfg.memory_index}.json"
-        if os.path.exists(self.filename):
-            with open(self.filename, 'rb') as f:
-                loaded = orjson.loads(f.read())
-                self.data = CacheContent(**loaded)
-        else:
-            self.data = CacheContent()
+        self.store = SegmentStore(f"{cfg.memory_index}.store", EMBED_DIM)
+        if os.path.exists(self.filename) and len(self.store) == 0:
+            self._migrate_json()
+        self.index = create_index(cfg, self.store)
+
+    def _migrate_json(self) -> None:
+        """
+        One-time import of the old single-file JSON format into the
+        segment store. The JSON file is kept, renamed, as a backup.
+        """
+        with open(self.filename, 'rb') as f:
+            loaded = CacheContent(**orjson.loads(f.read()))
+        embeddings = np.array(loaded.embeddings, dtype=np.float32)
+        if len(loaded.texts):
+            # The old format prepended each new embedding while appending its
+            # text, so the rows were stored in reverse order.
+            self.store.extend(loaded.texts, embeddings[::-1])
+        os.replace(self.filename, f"{self.filename}.migrated")
 
     def add(self, text: str):
         """
@@ -46,35 +56,35 @@ class LocalCache(MemoryProviderSingleton):
         """
         if 'Command Error:' in text:
             return ""
-        self.data.texts.append(text)
-
         embedding = get_ada_embedding(text)
 
-        vector = np.array(embedding).astype(np.float32)
-        vector = vector[np.newaxis, :]
-        self.data.embeddings = np.concatenate(
-            [
-                vector,
-                self.data.embeddings,
-            ],
-            axis=0,
-        )
-
-        with open(self.filename, 'wb') as f:
-            out = orjson.dumps(
-                self.data,
-                option=SAVE_OPTIONS
-            )
-            f.write(out)
+        self._insert([text], [embedding])
         return text
 
+    def _insert(self, texts: List[str], embeddings: List[List[float]]):
+        """
+        Append rows whose embeddings are already known to the store and index
+
+        Args:
+            texts: List[str]
+            embeddings: List[List[float]]
+
+        Returns: None
+        """
+        vectors = np.array(embeddings, dtype=np.float32)
+        row = len(self.store)
+        self.store.extend(texts, vectors)
+        self.index.add(row, vectors)
+
     def clear(self) -> str:
         """
         Clears the redis server.
 
         Returns: A message indicating that the memory has been cleared.
         """
-        self.data = CacheContent()
+        self.flush()
+        self.store.clear()
+        self.index.clear()
         return "Obliviated"
 
     def get(self, data: str) -> Optional[List[Any]]:
@@ -99,16 +109,34 @@ class LocalCache(MemoryProviderSingleton):
 
         Returns: List[str]
         """
-        embedding = get_ada_embedding(text)
+        self.flush()
+        embedding = np.array(get_ada_embedding(text), dtype=np.float32)
+
+        top_k_indices = self.index.search(embedding, k)
+
+        return self.store.read_texts(top_k_indices)
 
-        scores = np.dot(self.data.embeddings, embedding)
+    def get_relevant_many(self, texts: List[str], k: int) -> List[List[Any]]:
+        """
+        Embeds every query in one request, scores them all with a single
+         matrix-matrix product and partially sorts each row for its top-k
+        Args:
+            texts: List[str]
+            k: int
+
+        Returns: List[List[str]]
+        """
+        self.flush()
+        embeddings = np.array(get_ada_embeddings(texts), dtype=np.float32)
 
-        top_k_indices = np.argsort(scores)[-k:][::-1]
+        top_k_indices = self.index.search_many(embeddings, k)
 
-        return [self.data.texts[i] for i in top_k_indices]
+        return [self.store.read_texts(indices) for indices in top_k_indices]
 
     def get_stats(self):
         """
         Returns: The stats of the local cache.
         """
-        return len(self.data.texts), self.data.embeddings.shape
+        self.flush()
+        rows = len(self.store)
+        return rows, (rows, EMBED_DIM)
@@ -1,7 +1,22 @@
+import atexit
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import pinecone
 
-from memory.base import MemoryProviderSingleton, get_ada_embedding
+from memory.base import EMBED_DIM, MemoryProviderSingleton, get_ada_embedding, get_ada_embeddings
+
+# Pinecone accepts at most this many vectors per upsert request
+UPSERT_BATCH_SIZE = 100
+
+
+def vector_id(text):
+    """
+    Ids are derived from the text, so they stay unique across restarts and
+    re-adding a text overwrites it instead of storing a duplicate.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 class PineconeMemory(MemoryProviderSingleton):
@@ -9,31 +24,61 @@ class PineconeMemory(MemoryProviderSingleton):
         pinecone_api_key = cfg.pinecone_api_key
         pinecone_region = cfg.pinecone_region
         pinecone.init(api_key=pinecone_api_key, environment=pinecone_region)
-        dimension = 1536
+        dimension = EMBED_DIM
         metric = "cosine"
         pod_type = "p1"
         table_name = "auto-gpt"
-        # this assumes we don't start with memory.
-        # for now this works.
-        # we'll need a more complicated and robust system if we want to start with memory.
-        self.vec_num = 0
         if table_name not in pinecone.list_indexes():
             pinecone.create_index(table_name, dimension=dimension, metric=metric, pod_type=pod_type)
         self.index = pinecone.Index(table_name)
+        # Each agent can keep its memories apart in its own namespace
+        self.namespace = cfg.pinecone_namespace
+        # Vectors waiting to be upserted. Full batches are sent right away,
+        # the remainder on flush(), which every reader calls first.
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=cfg.pinecone_upsert_workers)
+        atexit.register(self.flush)
 
     def add(self, data):
         vector = get_ada_embedding(data)
-        # no metadata here. We may wish to change that long term.
-        resp = self.index.upsert([(str(self.vec_num), vector, {"raw_text": data})])
-        _text = f"Inserting data into memory at index: {self.vec_num}:\n data: {data}"
-        self.vec_num += 1
+        _text = f"Inserting data into memory at index: {vector_id(data)}:\n data: {data}"
+        self._insert([data], [vector])
         return _text
 
+    def _insert(self, texts, embeddings):
+        with self._buffer_lock:
+            for data, vector in zip(texts, embeddings):
+                self._buffer.append((vector_id(data), list(vector), {"raw_text": data}))
+            full = len(self._buffer) - len(self._buffer) % UPSERT_BATCH_SIZE
+            vectors = self._buffer[:full]
+            del self._buffer[:full]
+        self._upsert(vectors)
+
+    def _upsert(self, vectors):
+        """Sends vectors in batches of UPSERT_BATCH_SIZE, several requests at a time."""
+        batches = [vectors[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(vectors), UPSERT_BATCH_SIZE)]
+        if len(batches) == 1:
+            self.index.upsert(vectors=batches[0], namespace=self.namespace)
+            return
+        # list() re-raises the first failed request
+        list(self._executor.map(
+            lambda batch: self.index.upsert(vectors=batch, namespace=self.namespace), batches))
+
+    def flush(self):
+        """Blocks until every queued and buffered write has been upserted."""
+        super().flush()
+        with self._buffer_lock:
+            vectors = self._buffer
+            self._buffer = []
+        self._upsert(vectors)
+
     def get(self, data):
         return self.get_relevant(data, 1)
 
     def clear(self):
-        self.index.delete(deleteAll=True)
+        self.flush()
+        self.index.delete(deleteAll=True, namespace=self.namespace)
         return "Obliviated"
 
     def get_relevant(self, data, num_relevant=5):
@@ -42,10 +87,27 @@ class PineconeMemory(MemoryProviderSingleton):
         :param data: The data to compare to.
         :param num_relevant: The number of relevant data to return. Defaults to 5
         """
+        self.flush()
         query_embedding = get_ada_embedding(data)
-        results = self.index.query(query_embedding, top_k=num_relevant, include_metadata=True)
-        sorted_results = sorted(results.matches, key=lambda x: x.score)
+        return self._query(query_embedding, num_relevant)
+
+    def get_relevant_many(self, texts, num_relevant=5):
+        """
+        Runs several relevance queries, embedding them in one request.
+        :param texts: The texts to compare to.
+        :param num_relevant: The number of relevant data to return per query. Defaults to 5
+        """
+        self.flush()
+        query_embeddings = get_ada_embeddings(texts)
+        return list(self._executor.map(
+            lambda query_embedding: self._query(query_embedding, num_relevant), query_embeddings))
+
+    def _query(self, query_embedding, num_relevant):
+        results = self.index.query(
+            list(query_embedding), top_k=num_relevant, include_metadata=True, namespace=self.namespace)
+        sorted_results = sorted(results.matches, key=lambda x: x.score, reverse=True)
         return [str(item['metadata']["raw_text"]) for item in sorted_results]
 
     def get_stats(self):
+        self.flush()
         return self.index.describe_index_stats()
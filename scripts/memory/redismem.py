@@ -1,26 +1,103 @@
 """Redis memory provider."""
+import re
+import time
 from typing import Any, List, Optional
 import redis
-from redis.commands.search.field import VectorField, TextField
+from redis.commands.search.field import NumericField, TagField, TextField, VectorField
 from redis.commands.search.query import Query
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 import numpy as np
 
-from memory.base import MemoryProviderSingleton, get_ada_embedding
+from memory.base import EMBED_DIM, MemoryProviderSingleton, get_ada_embedding, get_ada_embeddings
 
 
-SCHEMA = [
-    TextField("data"),
-    VectorField(
-        "embedding",
-        "HNSW",
-        {
-            "TYPE": "FLOAT32",
-            "DIM": 1536,
-            "DISTANCE_METRIC": "COSINE"
-        }
-    ),
-]
+VECTOR_DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16}
+# Seconds the index info returned by get_stats is reused for
+STATS_TTL = 30
+
+
+def build_schema(cfg) -> list:
+    """
+    Builds the index schema. The vector field's algorithm, storage type and
+    HNSW graph parameters come from the config.
+    """
+    attributes = {
+        "TYPE": cfg.redis_vector_type,
+        "DIM": EMBED_DIM,
+        "DISTANCE_METRIC": "COSINE"
+    }
+    if cfg.redis_initial_cap:
+        attributes["INITIAL_CAP"] = cfg.redis_initial_cap
+    if cfg.redis_vector_algorithm == "HNSW":
+        attributes["M"] = cfg.redis_hnsw_m
+        attributes["EF_CONSTRUCTION"] = cfg.redis_hnsw_ef_construction
+        attributes["EF_RUNTIME"] = cfg.redis_hnsw_ef_runtime
+    return [
+        TextField("data"),
+        TagField("tags"),
+        NumericField("created_at"),
+        VectorField("embedding", cfg.redis_vector_algorithm, attributes),
+    ]
+
+
+def build_knn_query(cfg, num_relevant: int, filter_expression: str = "*") -> Query:
+    """
+    Builds a KNN query over the embedding field. For HNSW indexes the
+    configured EF_RUNTIME is passed with the query, so changing it does not
+    require rebuilding the index.
+    """
+    knn = f"KNN {num_relevant} @embedding $vector"
+    if cfg.redis_vector_algorithm == "HNSW":
+        knn += f" EF_RUNTIME {cfg.redis_hnsw_ef_runtime}"
+    return Query(
+        f"{filter_expression}=>[{knn} AS vector_score]"
+    ).return_fields(
+        "data",
+        "vector_score"
+    ).sort_by("vector_score").dialect(2)
+
+
+def build_filter(
+    tags: Optional[List[str]] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None
+) -> str:
+    """
+    Builds a pre-filter for the KNN query, so the vector search only
+    considers matching entries.
+
+    Args:
+        tags: Only match entries with at least one of these tags.
+        since: Only match entries created at or after this unix time.
+        until: Only match entries created at or before this unix time.
+
+    Returns: The filter expression.
+    """
+    clauses = []
+    if tags:
+        escaped = [re.sub(r"(\W)", r"\\\1", tag) for tag in tags]
+        clauses.append("@tags:{" + " | ".join(escaped) + "}")
+    if since is not None or until is not None:
+        low = "-inf" if since is None else since
+        high = "+inf" if until is None else until
+        clauses.append(f"@created_at:[{low} {high}]")
+    return f"({' '.join(clauses)})" if clauses else "*"
+
+
+def parse_search_data(response) -> List[str]:
+    """
+    Extracts the data field of each hit from a search response, which is a
+    parsed Result for direct calls and may be the raw reply when pipelined.
+    """
+    if hasattr(response, "docs"):
+        return [doc.data for doc in response.docs]
+    data = []
+    # Raw FT.SEARCH reply: [total, key, [field, value, ...], key, [...], ...]
+    for fields in response[2::2]:
+        values = dict(zip(fields[::2], fields[1::2]))
+        value = values.get(b"data", values.get("data"))
+        data.append(value.decode("utf-8") if isinstance(value, bytes) else value)
+    return data
 
 
 class RedisMemory(MemoryProviderSingleton):
@@ -36,55 +113,90 @@ class RedisMemory(MemoryProviderSingleton):
         redis_host = cfg.redis_host
         redis_port = cfg.redis_port
         redis_password = cfg.redis_password
-        self.dimension = 1536
-        self.redis = redis.Redis(
+        self.vector_dtype = VECTOR_DTYPES[cfg.redis_vector_type]
+        self.pool = redis.BlockingConnectionPool(
             host=redis_host,
             port=redis_port,
             password=redis_password,
-            db=0  # Cannot be changed
+            db=0,  # Cannot be changed
+            max_connections=cfg.redis_pool_size
         )
+        self.redis = redis.Redis(connection_pool=self.pool)
         self.cfg = cfg
+        self._stats = None
+        self._stats_time = 0.0
         if cfg.wipe_redis_on_start:
             self.redis.flushall()
-        try:
-            self.redis.ft(f"{cfg.memory_index}").create_index(
-                fields=SCHEMA,
-                definition=IndexDefinition(
-                    prefix=[f"{cfg.memory_index}:"],
-                    index_type=IndexType.HASH
-                    )
-                )
-        except Exception as e:
-            print("Error creating Redis search index: ", e)
+        self._create_index()
         existing_vec_num = self.redis.get(f'{cfg.memory_index}-vec_num')
         self.vec_num = int(existing_vec_num.decode('utf-8')) if\
             existing_vec_num else 0
 
-    def add(self, data: str) -> str:
+    def _create_index(self) -> None:
+        """Creates the search index unless it already exists."""
+        existing = [
+            name.decode('utf-8') if isinstance(name, bytes) else name
+            for name in self.redis.execute_command("FT._LIST")
+        ]
+        if self.cfg.memory_index in existing:
+            return
+        self.redis.ft(f"{self.cfg.memory_index}").create_index(
+            fields=build_schema(self.cfg),
+            definition=IndexDefinition(
+                prefix=[f"{self.cfg.memory_index}:"],
+                index_type=IndexType.HASH
+                )
+            )
+
+    def add(self, data: str, tags: Optional[List[str]] = None) -> str:
         """
         Adds a data point to the memory.
 
         Args:
             data: The data to add.
+            tags: Optional tags that queries can filter on.
 
         Returns: Message indicating that the data has been added.
         """
         if 'Command Error:' in data:
             return ""
         vector = get_ada_embedding(data)
-        vector = np.array(vector).astype(np.float32).tobytes()
-        data_dict = {
-            b"data": data,
-            "embedding": vector
-        }
-        pipe = self.redis.pipeline()
-        pipe.hset(f"{self.cfg.memory_index}:{self.vec_num}", mapping=data_dict)
         _text = f"Inserting data into memory at index: {self.vec_num}:\n"\
             f"data: {data}"
-        self.vec_num += 1
+        self._insert([data], [vector], tags)
+        return _text
+
+    def _insert(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        tags: Optional[List[str]] = None
+    ) -> None:
+        """
+        Writes data points whose embeddings are already known in one pipeline.
+
+        Args:
+            texts: The data to add.
+            embeddings: One embedding per data point.
+            tags: Optional tags applied to every data point.
+
+        Returns: None
+        """
+        created_at = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for data, embedding in zip(texts, embeddings):
+            vector = np.array(embedding).astype(self.vector_dtype).tobytes()
+            data_dict = {
+                b"data": data,
+                "embedding": vector,
+                "created_at": created_at
+            }
+            if tags:
+                data_dict["tags"] = ",".join(tags)
+            pipe.hset(f"{self.cfg.memory_index}:{self.vec_num}", mapping=data_dict)
+            self.vec_num += 1
         pipe.set(f'{self.cfg.memory_index}-vec_num', self.vec_num)
         pipe.execute()
-        return _text
 
     def get(self, data: str) -> Optional[List[Any]]:
         """
@@ -103,41 +215,87 @@ class RedisMemory(MemoryProviderSingleton):
 
         Returns: A message indicating that the memory has been cleared.
         """
+        self.flush()
         self.redis.flushall()
         return "Obliviated"
 
     def get_relevant(
         self,
         data: str,
-        num_relevant: int = 5
+        num_relevant: int = 5,
+        tags: Optional[List[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
     ) -> Optional[List[Any]]:
         """
         Returns all the data in the memory that is relevant to the given data.
         Args:
             data: The data to compare to.
             num_relevant: The number of relevant data to return.
+            tags: Only consider data with at least one of these tags.
+            since: Only consider data added at or after this unix time.
+            until: Only consider data added at or before this unix time.
 
         Returns: A list of the most relevant data.
         """
-        query_embedding = get_ada_embedding(data)
-        base_query = f"*=>[KNN {num_relevant} @embedding $vector AS vector_score]"
-        query = Query(base_query).return_fields(
-            "data",
-            "vector_score"
-        ).sort_by("vector_score").dialect(2)
-        query_vector = np.array(query_embedding).astype(np.float32).tobytes()
+        return self.get_relevant_many(
+            [data], num_relevant, tags=tags, since=since, until=until
+        )[0]
+
+    def get_relevant_many(
+        self,
+        texts: List[str],
+        num_relevant: int = 5,
+        tags: Optional[List[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> List[Optional[List[Any]]]:
+        """
+        Runs several relevance queries, embedding them in one request and
+        sending every KNN search in one pipelined round trip.
+        Args:
+            texts: The texts to compare to.
+            num_relevant: The number of relevant data to return per query.
+            tags: Only consider data with at least one of these tags.
+            since: Only consider data added at or after this unix time.
+            until: Only consider data added at or before this unix time.
+
+        Returns: One list of the most relevant data per text.
+        """
+        self.flush()
+        query_embeddings = get_ada_embeddings(texts)
+        query = build_knn_query(
+            self.cfg, num_relevant, build_filter(tags, since, until)
+        )
+
+        pipe = self.redis.ft(f"{self.cfg.memory_index}").pipeline(
+            transaction=False
+        )
+        for query_embedding in query_embeddings:
+            query_vector = np.array(query_embedding).astype(self.vector_dtype).tobytes()
+            pipe.search(query, query_params={"vector": query_vector})
 
         try:
-            results = self.redis.ft(f"{self.cfg.memory_index}").search(
-                query, query_params={"vector": query_vector}
-            )
+            responses = pipe.execute(raise_on_error=False)
         except Exception as e:
             print("Error calling Redis search: ", e)
-            return None
-        return [result.data for result in results.docs]
+            return [None] * len(texts)
+        results = []
+        for response in responses:
+            if isinstance(response, Exception):
+                print("Error calling Redis search: ", response)
+                results.append(None)
+            else:
+                results.append(parse_search_data(response))
+        return results
 
     def get_stats(self):
         """
-        Returns: The stats of the memory index.
+        Returns: The stats of the memory index. The index info is refreshed
+            at most every STATS_TTL seconds, the entry count is always current.
         """
-        return self.redis.ft(f"{self.cfg.memory_index}").info()
+        self.flush()
+        if self._stats is None or time.time() - self._stats_time > STATS_TTL:
+            self._stats = self.redis.ft(f"{self.cfg.memory_index}").info()
+            self._stats_time = time.time()
+        return {"vec_num": self.vec_num, "index_info": self._stats}
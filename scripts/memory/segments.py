@@ -0,0 +1,462 @@
+"""Append-only, segmented on-disk storage for the local memory cache."""
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+import orjson
+
+
+# Rows written to the active segment before it is sealed and a new one started
+SEGMENT_ROWS = 4096
+# Number of sealed segments that triggers a background compaction
+COMPACT_AFTER = 4
+MANIFEST = "manifest.json"
+# Rows preallocated when an empty active segment receives its first write
+INITIAL_CAPACITY = 64
+# Each index row is an (offset, length) pair locating a text in the text log
+INDEX_ROW_BYTES = 2 * np.dtype(np.uint64).itemsize
+
+
+class Segment:
+    """
+    A single segment of the store, made of three files sharing a prefix:
+
+        <id>.vec  float32 embedding rows, memory-mapped
+        <id>.txt  utf-8 text log
+        <id>.idx  uint64 (offset, length) pairs into the text log, one per row
+
+    Rows are committed by the index write, which always happens last. The
+    active segment's vector file is preallocated and doubled in capacity as
+    it fills, so an insert only writes one row into the mapping. Sealed
+    segments are trimmed and mapped read-only, which lets several processes
+    share their pages.
+    """
+
+    def __init__(
+        self,
+        dirname: str,
+        segment_id: int,
+        dim: int,
+        sealed: bool = False
+    ) -> None:
+        self.segment_id = segment_id
+        self.dim = dim
+        self.sealed = sealed
+        self.prefix = segment_prefix(dirname, segment_id)
+        self._handles = None
+        self._vectors = None
+        # Readers holding the segment, and whether it was dropped from the store
+        self.readers = 0
+        self.retired = False
+        self.rows = self._recover()
+        self._map()
+
+    def path(self, ext: str) -> str:
+        return f"{self.prefix}.{ext}"
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * 4
+
+    @property
+    def capacity(self) -> int:
+        return os.path.getsize(self.path("vec")) // self.row_bytes
+
+    def _recover(self) -> int:
+        """
+        Count the committed rows and truncate any partially written tail
+        left behind by an interrupted write.
+
+        Returns: The number of rows in the segment.
+        """
+        for ext in ("vec", "txt", "idx"):
+            if not os.path.exists(self.path(ext)):
+                open(self.path(ext), "wb").close()
+
+        index = np.fromfile(self.path("idx"), dtype=np.uint64)
+        index = index[:index.size - index.size % 2].reshape(-1, 2)
+        rows = min(len(index), self.capacity)
+        text_end = 0
+        if rows:
+            offset, length = index[rows - 1]
+            text_end = int(offset + length)
+            if os.path.getsize(self.path("txt")) < text_end:
+                raise ValueError(f"Corrupt memory segment: {self.prefix}")
+
+        vec_rows = rows if self.sealed else self.capacity
+        for ext, size in (
+            ("vec", vec_rows * self.row_bytes),
+            ("txt", text_end),
+            ("idx", rows * INDEX_ROW_BYTES),
+        ):
+            if os.path.getsize(self.path(ext)) != size:
+                os.truncate(self.path(ext), size)
+        self.text_size = text_end
+        self._index = index[:rows].copy()
+        return rows
+
+    def _map(self) -> None:
+        """(Re)create the memory map over the vector file."""
+        self._vectors = None
+        capacity = self.capacity
+        if capacity:
+            self._vectors = np.memmap(
+                self.path("vec"),
+                dtype=np.float32,
+                mode="r" if self.sealed else "r+",
+                shape=(capacity, self.dim),
+            )
+
+    def _reserve(self, rows: int) -> None:
+        """Grow the vector file and index to hold at least `rows` rows."""
+        capacity = self.capacity
+        if rows > capacity:
+            capacity = max(rows, 2 * capacity, INITIAL_CAPACITY)
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._vectors = None
+            os.truncate(self.path("vec"), capacity * self.row_bytes)
+            self._map()
+        if rows > len(self._index):
+            index = np.zeros((max(rows, 2 * len(self._index)), 2), np.uint64)
+            index[:self.rows] = self._index[:self.rows]
+            self._index = index
+
+    def embeddings(self) -> np.ndarray:
+        """Returns: A (rows, dim) view of the mapped embeddings."""
+        if self._vectors is None:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self._vectors[:self.rows]
+
+    def read_texts(self, rows: Optional[List[int]] = None) -> List[str]:
+        """
+        Read texts from the log by their row numbers within this segment.
+
+        Args:
+            rows: The rows to read. Defaults to every row.
+
+        Returns: The texts, in the order requested.
+        """
+        if rows is None:
+            rows = range(self.rows)
+        texts = []
+        with open(self.path("txt"), "rb") as f:
+            for row in rows:
+                offset, length = self._index[row].tolist()
+                f.seek(offset)
+                texts.append(f.read(length).decode("utf-8"))
+        return texts
+
+    def extend(self, texts: List[str], vectors: np.ndarray) -> None:
+        """
+        Append rows to the end of the segment. Only the new rows are written.
+
+        Args:
+            texts: The texts to append.
+            vectors: A (len(texts), dim) matrix of embeddings.
+        """
+        if self._handles is None:
+            self._handles = {
+                ext: open(self.path(ext), "ab") for ext in ("txt", "idx")
+            }
+        start, stop = self.rows, self.rows + len(texts)
+        self._reserve(stop)
+
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.array([len(data) for data in encoded], dtype=np.uint64)
+        offsets = self.text_size + np.cumsum(lengths) - lengths
+        index = np.stack([offsets, lengths], axis=1).astype(np.uint64)
+
+        self._vectors[start:stop] = vectors
+        self._handles["txt"].write(b"".join(encoded))
+        self._handles["txt"].flush()
+        self._handles["idx"].write(index.tobytes())
+        self._handles["idx"].flush()
+
+        self._index[start:stop] = index
+        self.text_size += int(lengths.sum())
+        self.rows = stop
+
+    def seal(self) -> None:
+        """Trim the preallocated space and remap the segment read-only."""
+        self.close()
+        self._vectors = None
+        os.truncate(self.path("vec"), self.rows * self.row_bytes)
+        self.sealed = True
+        self._map()
+
+    def close(self) -> None:
+        if self._vectors is not None and not self.sealed:
+            self._vectors.flush()
+        if self._handles is not None:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles = None
+
+    def delete(self) -> None:
+        self.close()
+        self._vectors = None
+        for ext in ("vec", "txt", "idx"):
+            if os.path.exists(self.path(ext)):
+                os.remove(self.path(ext))
+
+
+def segment_prefix(dirname: str, segment_id: int) -> str:
+    return os.path.join(dirname, f"{segment_id:06d}")
+
+
+class SegmentStore:
+    """
+    An append-only store of (text, embedding) rows split across segments.
+
+    New rows go to the active (last) segment. Once it holds `segment_rows`
+    rows it is sealed, and when `compact_after` sealed segments pile up they
+    are merged into one in a background thread. The ordered list of live
+    segments is kept in a small manifest that is replaced atomically.
+
+    Reads work on a snapshot of the segment list. Segments dropped by a
+    compaction or a clear are only deleted once no snapshot holds them.
+    """
+
+    def __init__(
+        self,
+        dirname: str,
+        dim: int,
+        segment_rows: int = SEGMENT_ROWS,
+        compact_after: int = COMPACT_AFTER,
+    ) -> None:
+        self.dirname = dirname
+        self.dim = dim
+        self.segment_rows = segment_rows
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+        self._generation = 0
+
+        os.makedirs(dirname, exist_ok=True)
+        manifest_path = os.path.join(dirname, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "rb") as f:
+                manifest = orjson.loads(f.read())
+            self.next_id = manifest["next_id"]
+            segment_ids = manifest["segments"]
+            self.segments = [
+                Segment(dirname, segment_id, dim,
+                        sealed=i < len(segment_ids) - 1)
+                for i, segment_id in enumerate(segment_ids)
+            ]
+        else:
+            self.next_id = 0
+            self.segments = []
+        self._remove_orphans()
+        if not self.segments:
+            self.segments.append(self._new_segment())
+        self._write_manifest()
+
+    def __len__(self) -> int:
+        return sum(segment.rows for segment in self.segments)
+
+    def _new_segment(self) -> Segment:
+        segment = Segment(self.dirname, self.next_id, self.dim)
+        self.next_id += 1
+        return segment
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "next_id": self.next_id,
+            "segments": [segment.segment_id for segment in self.segments],
+        }
+        tmp_path = os.path.join(self.dirname, f"{MANIFEST}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(manifest))
+        os.replace(tmp_path, os.path.join(self.dirname, MANIFEST))
+
+    def _remove_orphans(self) -> None:
+        """Delete segment files left behind by an interrupted compaction."""
+        live = {f"{segment.segment_id:06d}" for segment in self.segments}
+        for filename in os.listdir(self.dirname):
+            stem, ext = os.path.splitext(filename)
+            if ext in (".vec", ".txt", ".idx") and stem not in live:
+                os.remove(os.path.join(self.dirname, filename))
+
+    def embedding_blocks(self) -> List[np.ndarray]:
+        """
+        Returns: The mapped embeddings of each segment, in row order. The
+            blocks are views, so nothing is copied.
+        """
+        with self._lock:
+            return [segment.embeddings() for segment in self.segments]
+
+    @contextmanager
+    def _snapshot(self):
+        """Yields: The current segments, kept on disk until the block exits."""
+        with self._lock:
+            segments = list(self.segments)
+            for segment in segments:
+                segment.readers += 1
+        try:
+            yield segments
+        finally:
+            with self._lock:
+                for segment in segments:
+                    segment.readers -= 1
+                    if segment.retired and segment.readers == 0:
+                        segment.delete()
+
+    def _retire(self, segment: Segment) -> None:
+        """Delete a segment dropped from the store once no reader holds it. Needs the lock."""
+        segment.retired = True
+        if segment.readers == 0:
+            segment.delete()
+
+    @staticmethod
+    def _locate(segments: List[Segment], rows):
+        """
+        Group store-wide row numbers by the segment holding them.
+
+        Yields: (segment, positions in `rows`, row numbers within the segment)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = np.cumsum([0] + [segment.rows for segment in segments])
+        owners = np.searchsorted(starts, rows, side="right") - 1
+        for owner in np.unique(owners).tolist():
+            positions = np.flatnonzero(owners == owner)
+            yield segments[owner], positions, rows[positions] - starts[owner]
+
+    def read_embeddings(self, rows: Optional[List[int]] = None) -> np.ndarray:
+        """
+        Copy embeddings out of the store by row number.
+
+        Args:
+            rows: The rows to read. Defaults to every row.
+
+        Returns: A (len(rows), dim) matrix, in the order requested.
+        """
+        if rows is None:
+            return np.concatenate(self.embedding_blocks(), axis=0)
+        embeddings = np.empty((len(rows), self.dim), dtype=np.float32)
+        with self._snapshot() as segments:
+            for segment, positions, local_rows in self._locate(segments, rows):
+                embeddings[positions] = segment.embeddings()[local_rows]
+        return embeddings
+
+    def read_texts(self, rows: Optional[List[int]] = None) -> List[str]:
+        """
+        Read texts by their row numbers across the whole store.
+
+        Args:
+            rows: The rows to read. Defaults to every row.
+
+        Returns: The texts, in the order requested.
+        """
+        with self._snapshot() as segments:
+            if rows is None:
+                return [text for segment in segments for text in segment.read_texts()]
+
+            texts = [None] * len(rows)
+            for segment, positions, local_rows in self._locate(segments, rows):
+                for i, text in zip(positions, segment.read_texts(local_rows.tolist())):
+                    texts[i] = text
+        return texts
+
+    def extend(self, texts: List[str], vectors: np.ndarray) -> None:
+        """
+        Append rows to the store, sealing full segments along the way.
+
+        Args:
+            texts: The texts to append.
+            vectors: A (len(texts), dim) matrix of embeddings.
+        """
+        with self._lock:
+            start = 0
+            while start < len(texts):
+                active = self.segments[-1]
+                room = max(self.segment_rows - active.rows, 0)
+                if room == 0:
+                    active.seal()
+                    self.segments.append(self._new_segment())
+                    self._write_manifest()
+                    continue
+                stop = start + room
+                active.extend(texts[start:stop], vectors[start:stop])
+                start = stop
+            self._maybe_compact()
+
+    def append(self, text: str, vector: np.ndarray) -> None:
+        self.extend([text], np.asarray(vector, dtype=np.float32)[np.newaxis, :])
+
+    def clear(self) -> None:
+        """Delete every segment and start over with an empty one."""
+        with self._lock:
+            self._generation += 1
+            for segment in self.segments:
+                self._retire(segment)
+            self.segments = [self._new_segment()]
+            self._write_manifest()
+
+    def close(self) -> None:
+        self.wait_for_compaction()
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+
+    def wait_for_compaction(self) -> None:
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _maybe_compact(self) -> None:
+        """Start a background merge of the sealed segments if due."""
+        sealed = self.segments[:-1]
+        if len(sealed) < self.compact_after:
+            return
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        merged_id = self.next_id
+        self.next_id += 1
+        self._compaction = threading.Thread(
+            target=self._compact,
+            args=(sealed, merged_id, self._generation),
+            daemon=True,
+        )
+        self._compaction.start()
+
+    def _compact(
+        self,
+        sealed: List[Segment],
+        merged_id: int,
+        generation: int
+    ) -> None:
+        """
+        Merge the sealed segments into one and swap it into the manifest.
+        Sealed segments are immutable, so this runs without holding the lock
+        until the final swap.
+        """
+        prefix = segment_prefix(self.dirname, merged_id)
+        with open(f"{prefix}.vec", "wb") as vec_out, \
+                open(f"{prefix}.txt", "wb") as txt_out, \
+                open(f"{prefix}.idx", "wb") as idx_out:
+            text_offset = 0
+            for segment in sealed:
+                with open(segment.path("vec"), "rb") as f:
+                    shutil.copyfileobj(f, vec_out)
+                with open(segment.path("txt"), "rb") as f:
+                    shutil.copyfileobj(f, txt_out)
+                index = segment._index[:segment.rows].copy()
+                index[:, 0] += np.uint64(text_offset)
+                idx_out.write(index.tobytes())
+                text_offset += segment.text_size
+        merged = Segment(self.dirname, merged_id, self.dim, sealed=True)
+
+        with self._lock:
+            if (generation != self._generation
+                    or self.segments[:len(sealed)] != sealed):
+                merged.delete()
+                return
+            self.segments = [merged] + self.segments[len(sealed):]
+            self._write_manifest()
+            for segment in sealed:
+                self._retire(segment)
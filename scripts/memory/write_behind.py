@@ -0,0 +1,55 @@
+"""Background queue that batches memory writes."""
+import atexit
+import threading
+from typing import Callable, List
+
+
+class WriteBehindQueue:
+    """
+    Collects texts to be added to memory and writes them from a background
+    thread. A text queued while the writer is idle is written straight away,
+    so it is usually stored before the next query needs it; texts queued
+    while a write is in flight are coalesced into the next batch, of at most
+    `batch_size` texts. Readers call `flush` to wait for pending writes.
+    """
+
+    def __init__(self, write_batch: Callable[[List[str]], None], batch_size: int) -> None:
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self._pending: List[str] = []
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def put(self, text: str) -> None:
+        with self._cond:
+            self._pending.append(text)
+            self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Block until every queued text has been written."""
+        with self._cond:
+            while self._pending or self._in_flight:
+                self._cond.wait()
+
+    def _next_batch(self) -> List[str]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                print(f"Error adding {len(batch)} texts to memory: ", e)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
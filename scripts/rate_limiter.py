@@ -0,0 +1,176 @@
+"""Client-side rate limiting and retries for LLM API requests."""
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+
+import openai
+
+import token_counter
+
+# Lower values are served first when requests are waiting for quota
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+)
+
+# Tokens reserved for the reply when a request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# After a rate limit error the refill rate is halved, down to this fraction,
+# and recovers by RECOVERY_STEP after each successful request
+MIN_SCALE = 0.1
+RECOVERY_STEP = 0.05
+
+_priority = contextvars.ContextVar("llm_request_priority", default=PRIORITY_NORMAL)
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """Makes the LLM requests in this block, on this thread, wait at the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_chat_tokens(messages, model, max_tokens=None):
+    """Tokens a chat completion counts against the quota: the prompt plus the reply allowance."""
+    try:
+        prompt_tokens = token_counter.count_message_tokens(messages, model)
+    except NotImplementedError:
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+    return prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBucket:
+    """Holds up to `per_minute` units and refills continuously at `per_minute` per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.scale = 1.0
+        self.available = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate * self.scale)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available. Requests larger than the bucket wait for a full one."""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.available) / (self.rate * self.scale))
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Keeps requests to one model within requests-per-minute and
+    tokens-per-minute budgets. Waiting requests are served in priority order,
+    then first come first served. Retryable API errors are retried with
+    exponential backoff and jitter; a rate limit error pauses every caller and
+    slows the refill rate, so retries do not all arrive at once.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._order = itertools.count()
+        self._paused_until = 0.0
+
+    def acquire(self, tokens, priority=None):
+        """Blocks until this request's turn comes and the quota allows it."""
+        if priority is None:
+            priority = _priority.get()
+        ticket = (priority, next(self._order))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    wait = max(
+                        self._paused_until - now,
+                        self.requests.wait_time(1, now),
+                        self.tokens.wait_time(tokens, now),
+                    )
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        return
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _set_scale(self, scale):
+        now = time.monotonic()
+        for bucket in (self.requests, self.tokens):
+            bucket.refill(now)
+            bucket.scale = scale
+
+    def _rate_limited(self, delay):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._set_scale(max(MIN_SCALE, self.requests.scale / 2))
+            self._cond.notify_all()
+
+    def _succeeded(self):
+        if self.requests.scale < 1.0:
+            with self._cond:
+                self._set_scale(min(1.0, self.requests.scale + RECOVERY_STEP))
+
+    def call(self, function, tokens):
+        """Returns function(), called within the quota and retried on retryable errors."""
+        for attempt in itertools.count():
+            self.acquire(tokens)
+            try:
+                result = function()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"Warning: {e.__class__.__name__} from the API. Retrying in {delay:.1f} seconds...")
+                if isinstance(e, openai.error.RateLimitError):
+                    # Everyone waits; this request waits again in acquire()
+                    self._rate_limited(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            self._succeeded()
+            return result
+
+    def stream(self, open_stream, tokens):
+        """Like call() for a generator of chunks. Errors before the first chunk are retried."""
+        def first_chunk():
+            chunks = open_stream()
+            return chunks, next(chunks, None)
+
+        chunks, first = self.call(first_chunk, tokens)
+        if first is None:
+            return
+        yield first
+        yield from chunks
@@ -28,9 +28,15 @@ class Spinner:
         self.spinner_thread = threading.Thread(target=self.spin)
         self.spinner_thread.start()
 
-    def __exit__(self, exc_type, exc_value, exc_traceback):
-        """Stop the spinner"""
+    def stop(self):
+        """Stop the spinner and clear its line, if it is still running"""
+        if not self.running:
+            return
         self.running = False
         self.spinner_thread.join()
         sys.stdout.write('\r' + ' ' * (len(self.message) + 2) + '\r')
         sys.stdout.flush()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """Stop the spinner"""
+        self.stop()
@@ -1,29 +1,41 @@
 import tiktoken
+from functools import lru_cache
 from typing import List, Dict
 
-def count_message_tokens(messages : List[Dict[str, str]], model : str = "gpt-3.5-turbo-0301") -> int:
+# Models that may change over time are counted as the snapshot they currently point to
+MODEL_SNAPSHOTS = {
+    # !Note: gpt-3.5-turbo may change over time. Returning num tokens assuming gpt-3.5-turbo-0301.
+    "gpt-3.5-turbo": "gpt-3.5-turbo-0301",
+    # !Note: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314.
+    "gpt-4": "gpt-4-0314",
+}
+
+# Number of distinct messages whose token counts are remembered
+MESSAGE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
     """
-    Returns the number of tokens used by a list of messages.
+    Returns the tiktoken encoding for a model, resolved once per model.
 
     Args:
-    messages (list): A list of messages, each of which is a dictionary containing the role and content of the message.
-    model (str): The name of the model to use for tokenization. Defaults to "gpt-3.5-turbo-0301".
+    model (str): The name of the model.
 
     Returns:
-    int: The number of tokens used by the list of messages.
+    Encoding: The encoding used by the model, or cl100k_base if the model is unknown.
     """
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
         print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model == "gpt-3.5-turbo":
-        # !Node: gpt-3.5-turbo may change over time. Returning num tokens assuming gpt-3.5-turbo-0301.")
-        return count_message_tokens(messages, model="gpt-3.5-turbo-0301")
-    elif model == "gpt-4":
-        # !Note: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314.")
-        return count_message_tokens(messages, model="gpt-4-0314")
-    elif model == "gpt-3.5-turbo-0301":
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=MESSAGE_CACHE_SIZE)
+def _count_single_message(message_items: tuple, model: str) -> int:
+    """Tokens used by one message, excluding the reply priming. Memoized on the message content."""
+    if model == "gpt-3.5-turbo-0301":
         tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
         tokens_per_name = -1  # if there's a name, the role is omitted
     elif model == "gpt-4-0314":
@@ -31,16 +43,47 @@ def count_message_tokens(messages : List[Dict[str, str]], model : str = "gpt-3.5
         tokens_per_name = 1
     else:
         raise NotImplementedError(f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens.""")
+    encoding = get_encoding(model)
+    num_tokens = tokens_per_message
+    for key, value in message_items:
+        num_tokens += len(encoding.encode(value))
+        if key == "name":
+            num_tokens += tokens_per_name
+    return num_tokens
+
+
+def count_message_tokens(messages : List[Dict[str, str]], model : str = "gpt-3.5-turbo-0301") -> int:
+    """
+    Returns the number of tokens used by a list of messages.
+    Messages already counted for the model are not encoded again.
+
+    Args:
+    messages (list): A list of messages, each of which is a dictionary containing the role and content of the message.
+    model (str): The name of the model to use for tokenization. Defaults to "gpt-3.5-turbo-0301".
+
+    Returns:
+    int: The number of tokens used by the list of messages.
+    """
     num_tokens = 0
     for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
+        num_tokens += count_single_message_tokens(message, model)
     num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
     return num_tokens
 
+def count_single_message_tokens(message : Dict[str, str], model : str = "gpt-3.5-turbo-0301") -> int:
+    """
+    Returns the number of tokens one message adds to a list of messages,
+    not counting the tokens that prime the reply.
+
+    Args:
+    message (dict): A dictionary containing the role and content of the message.
+    model (str): The name of the model to use for tokenization. Defaults to "gpt-3.5-turbo-0301".
+
+    Returns:
+    int: The number of tokens used by the message.
+    """
+    return _count_single_message(tuple(message.items()), MODEL_SNAPSHOTS.get(model, model))
+
 def count_string_tokens(string: str, model_name: str) -> int:
     """
     Returns the number of tokens in a text string.
@@ -52,6 +95,6 @@ def count_string_tokens(string: str, model_name: str) -> int:
     Returns:
     int: The number of tokens in the text string.
     """
-    encoding = tiktoken.encoding_for_model(model_name)
+    encoding = get_encoding(model_name)
     num_tokens = len(encoding.encode(string))
     return num_tokens
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import token_counter
+
+from fakes import WordEncoding
+
+
+@pytest.fixture
+def word_encoding(monkeypatch):
+    """Counts tokens as whitespace separated words, without tiktoken's downloaded encodings."""
+    monkeypatch.setattr(token_counter, "get_encoding", lambda model: WordEncoding())
+    token_counter._count_single_message.cache_clear()
+    yield
+    token_counter._count_single_message.cache_clear()
@@ -0,0 +1,118 @@
+"""
+In-process stand-in for the pinecone client, so PineconeMemory can be tested
+and benchmarked offline. Replace the module used by memory.pinecone:
+
+    monkeypatch.setattr("memory.pinecone.pinecone", FakePinecone())
+"""
+import threading
+import time
+
+import numpy as np
+
+# Same limit as the real service
+MAX_UPSERT_VECTORS = 100
+
+
+class Match(dict):
+    """Query match supporting both match.score and match['metadata']."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FakeQueryResponse:
+    def __init__(self, matches):
+        self.matches = matches
+
+
+class FakeIndex:
+    """
+    Cosine-similarity index held in memory. Each request sleeps for `latency`
+    seconds to stand in for the network round trip.
+    """
+
+    def __init__(self, dimension, latency=0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.namespaces = {}
+        self.upsert_requests = []
+        self._lock = threading.Lock()
+
+    def _request(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def upsert(self, vectors, namespace=""):
+        self._request()
+        if len(vectors) > MAX_UPSERT_VECTORS:
+            raise ValueError(f"Upsert of {len(vectors)} vectors exceeds the limit of {MAX_UPSERT_VECTORS}")
+        with self._lock:
+            self.upsert_requests.append(len(vectors))
+            stored = self.namespaces.setdefault(namespace, {})
+            for id, values, metadata in vectors:
+                if len(values) != self.dimension:
+                    raise ValueError(f"Vector dimension {len(values)} does not match {self.dimension}")
+                stored[id] = (np.asarray(values, dtype=np.float32), metadata)
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k=10, include_metadata=False, namespace=""):
+        self._request()
+        with self._lock:
+            items = list(self.namespaces.get(namespace, {}).items())
+        if not items:
+            return FakeQueryResponse([])
+        query = np.asarray(vector, dtype=np.float32)
+        matrix = np.stack([values for _, (values, _) in items])
+        scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        matches = []
+        for i in np.argsort(-scores)[:top_k]:
+            id, (_, metadata) = items[i]
+            match = Match(id=id, score=float(scores[i]))
+            if include_metadata:
+                match["metadata"] = metadata
+            matches.append(match)
+        return FakeQueryResponse(matches)
+
+    def delete(self, ids=None, deleteAll=False, namespace=""):
+        self._request()
+        with self._lock:
+            if deleteAll:
+                self.namespaces.pop(namespace, None)
+            else:
+                stored = self.namespaces.get(namespace, {})
+                for id in ids or []:
+                    stored.pop(id, None)
+        return {}
+
+    def describe_index_stats(self):
+        self._request()
+        with self._lock:
+            namespaces = {name: {"vector_count": len(stored)} for name, stored in self.namespaces.items()}
+        return {
+            "dimension": self.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+        }
+
+
+class FakePinecone:
+    """Implements the module-level functions of the pinecone client that PineconeMemory uses."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.indexes = {}
+
+    def init(self, api_key=None, environment=None):
+        pass
+
+    def list_indexes(self):
+        return list(self.indexes)
+
+    def create_index(self, name, dimension, metric="cosine", pod_type=None):
+        self.indexes[name] = FakeIndex(dimension, self.latency)
+
+    def Index(self, name):
+        return self.indexes[name]
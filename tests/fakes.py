@@ -0,0 +1,79 @@
+"""
+Fakes shared by the tests, so they run offline and deterministically. The
+`word_encoding` fixture in conftest.py puts WordEncoding in place of tiktoken.
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from memory.base import EMBED_DIM
+
+
+class WordEncoding:
+    """One token per whitespace separated word."""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def fake_embedding(text):
+    """Deterministic unit vector derived from the text."""
+    rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+    vector = rng.standard_normal(EMBED_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def fake_embeddings(texts):
+    return [fake_embedding(text) for text in texts]
+
+
+class FakeConfig:
+    """The settings the memory providers read, with small test values."""
+    memory_index = "test-memory"
+    local_memory_index_type = "flat"
+    local_memory_index_nlist = 4
+    local_memory_index_nprobe = 2
+    pinecone_api_key = "key"
+    pinecone_region = "region"
+    pinecone_namespace = "agent-1"
+    pinecone_upsert_workers = 4
+    redis_vector_algorithm = "HNSW"
+    redis_vector_type = "FLOAT32"
+    redis_hnsw_m = 16
+    redis_hnsw_ef_construction = 200
+    redis_hnsw_ef_runtime = 10
+    redis_initial_cap = 0
+
+
+class FakeCompletion:
+    """
+    Stands in for create_chat_completion: takes `delay` seconds, answers
+    reply(prompt) for the last message, and records the prompts and the
+    most calls that overlapped.
+    """
+
+    def __init__(self, reply, delay):
+        self.reply = reply
+        self.delay = delay
+        self.prompts = []
+        self.running = 0
+        self.most = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model, messages, temperature=None, max_tokens=None):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+            self.prompts.append(prompt)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        return self.reply(prompt)
@@ -0,0 +1,201 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import agent_manager
+
+from fakes import FakeCompletion
+
+
+pytestmark = pytest.mark.usefixtures("word_encoding")
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch, tmp_path):
+    """An empty registry saving agents to a temporary directory."""
+    monkeypatch.setattr(agent_manager.cfg, "persist_agents", True)
+    monkeypatch.setattr(agent_manager.cfg, "agent_dir", str(tmp_path / "agents"))
+    restart(monkeypatch)
+
+
+def restart(monkeypatch):
+    """Forget every agent in memory, as a new run would."""
+    monkeypatch.setattr(agent_manager, "agents", {})
+    monkeypatch.setattr(agent_manager, "agent_locks", {})
+    monkeypatch.setattr(agent_manager, "saved_keys", set())
+    monkeypatch.setattr(agent_manager, "next_key", 0)
+    monkeypatch.setattr(agent_manager, "_scanned", False)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = FakeCompletion(lambda prompt: f"reply to {prompt}", 0.1)
+    monkeypatch.setattr(agent_manager, "create_chat_completion", llm)
+    monkeypatch.setattr(agent_manager.cfg, "agent_workers", 4)
+    monkeypatch.setattr(agent_manager, "_executor", None)
+    return llm
+
+
+class TestMessageAgents:
+
+    # Tests that messages to different agents run at the same time and keep their order.
+    def test_fan_out(self, llm):
+        keys = [agent_manager.create_agent("task", "hi", "gpt-3.5-turbo")[0] for _ in range(4)]
+        start = time.time()
+        results = agent_manager.message_agents([(key, f"message {key}") for key in reversed(keys)])
+
+        assert time.time() - start < 0.3
+        assert llm.most == 4
+        assert results == [(key, f"reply to message {key}") for key in reversed(keys)]
+
+    # Tests that messages to the same agent are answered one at a time.
+    def test_same_agent(self, llm):
+        key, _ = agent_manager.create_agent("task", "hi", "gpt-3.5-turbo")
+        llm.most = 0
+        agent_manager.message_agents([(key, "one"), (key, "two")])
+
+        _, messages, _ = agent_manager.agents[key]
+        assert llm.most == 1
+        assert sorted(message["content"] for message in messages[2::2]) == ["one", "two"]
+        assert [message["role"] for message in messages] == ["user", "assistant"] * 3
+
+    # Tests that a missing agent fails on its own without affecting the others.
+    def test_missing_agent(self, llm):
+        key, _ = agent_manager.create_agent("task", "hi", "gpt-3.5-turbo")
+        results = dict(agent_manager.message_agents([(key, "hello"), (99, "hello")]))
+
+        assert results[key] == "reply to hello"
+        assert isinstance(results[99], KeyError)
+
+
+# Tests that agents created from several threads get unique keys.
+def test_concurrent_create(llm):
+    threads = [threading.Thread(target=agent_manager.create_agent, args=("task", "hi", "gpt-3.5-turbo"))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(agent_manager.agents) == len(agent_manager.agent_locks) == 8
+
+
+class TestFitContext:
+
+    @pytest.fixture(autouse=True)
+    def small_limits(self, monkeypatch):
+        monkeypatch.setattr(agent_manager.cfg, "fast_token_limit", 100)
+        monkeypatch.setattr(agent_manager.cfg, "smart_token_limit", 200)
+        monkeypatch.setattr(agent_manager, "AGENT_REPLY_TOKENS", 20)
+        monkeypatch.setattr(agent_manager, "AGENT_SUMMARY_TOKENS", 10)
+        self.summaries = []
+
+        def summarize_messages(summary, messages):
+            self.summaries.append((summary, [message["content"] for message in messages]))
+            return f"summary {len(self.summaries)}"
+
+        monkeypatch.setattr(agent_manager, "summarize_messages", summarize_messages)
+
+    @staticmethod
+    def turns(count, words=5):
+        messages = []
+        for i in range(count):
+            messages.append({"role": "user", "content": f"question{i} " + "word " * (words - 1)})
+            messages.append({"role": "assistant", "content": f"answer{i} " + "word " * (words - 1)})
+        return messages
+
+    # Tests that messages within the limit are left alone.
+    def test_within_limit(self):
+        messages = [{"role": "user", "content": "You are an agent"}] + self.turns(3)
+        agent_manager.fit_context(messages, "gpt-3.5-turbo")
+        assert len(messages) == 7 and not self.summaries
+
+    # Tests that the oldest turns are folded into a summary after the pinned first message.
+    def test_sliding_window(self):
+        # 80 token budget: 9 for the first message, 3 for the priming, 20 for the summary
+        # and 10 for each turn's message
+        messages = [{"role": "user", "content": "You are an agent"}] + self.turns(6)
+        agent_manager.fit_context(messages, "gpt-3.5-turbo")
+
+        assert messages[0]["content"] == "You are an agent"
+        assert messages[1] == {"role": "system", "content": agent_manager.SUMMARY_PREFIX + "summary 1"}
+        assert messages[2]["content"].startswith("question4")
+        assert self.summaries[0][0] is None
+        assert [content.split()[0] for content in self.summaries[0][1]] == \
+            ["question0", "answer0", "question1", "answer1", "question2", "answer2", "question3", "answer3"]
+
+        # The next eviction updates the same summary
+        messages.extend(self.turns(3))
+        agent_manager.fit_context(messages, "gpt-3.5-turbo")
+        assert self.summaries[1][0] == "summary 1"
+        assert messages[1]["content"] == agent_manager.SUMMARY_PREFIX + "summary 2"
+        assert len([message for message in messages if agent_manager._is_summary(message)]) == 1
+
+    # Tests that the smart model gets the larger limit.
+    def test_smart_model_limit(self):
+        messages = [{"role": "user", "content": "You are an agent"}] + self.turns(6)
+        agent_manager.fit_context(messages, agent_manager.cfg.smart_llm_model)
+        assert not self.summaries
+
+
+class TestPersistence:
+
+    @pytest.fixture
+    def echo(self, monkeypatch):
+        """Fake completion that records the messages of each request."""
+        requests = []
+
+        def create_chat_completion(model, messages):
+            requests.append([message["content"] for message in messages])
+            return f"reply to {messages[-1]['content']}"
+
+        monkeypatch.setattr(agent_manager, "create_chat_completion", create_chat_completion)
+        return requests
+
+    # Tests that agents are listed after a restart without loading their histories, and keys keep counting.
+    def test_restart(self, echo, monkeypatch):
+        agent_manager.create_agent("first task", "hi", "gpt-3.5-turbo")
+        key, _ = agent_manager.create_agent("second task", "hi", "gpt-3.5-turbo")
+        agent_manager.message_agent(key, "remember this")
+        restart(monkeypatch)
+
+        assert agent_manager.list_agents() == [(0, "first task"), (1, "second task")]
+        assert agent_manager.agents == {}
+        assert agent_manager.create_agent("third task", "hi", "gpt-3.5-turbo")[0] == 2
+
+        agent_manager.message_agent(key, "what was it?")
+        assert echo[-1] == ["hi", "reply to hi", "remember this", "reply to remember this", "what was it?"]
+        assert list(agent_manager.agents) == [2, 1]
+
+    # Tests that summaries are replayed from the log and the summarized messages dropped from it.
+    def test_summary_replay(self, echo, monkeypatch):
+        key, _ = agent_manager.create_agent("task", "hi", "gpt-3.5-turbo")
+        for i in range(3):
+            agent_manager.message_agent(key, f"message {i}")
+
+        def fit_context(messages, model):
+            messages[1:5] = [{"role": "system", "content": agent_manager.SUMMARY_PREFIX + "summary"}]
+            return 4
+
+        monkeypatch.setattr(agent_manager, "fit_context", fit_context)
+        agent_manager.message_agent(key, "message 3")
+        messages = agent_manager.agents[key][1]
+        restart(monkeypatch)
+
+        assert agent_manager._get_agent(key)[1] == messages
+        with open(agent_manager._log_path(key)) as f:
+            assert len(f.readlines()) == 1 + len(messages)
+
+    # Tests that deleting an agent removes its log, whether it was loaded or not.
+    def test_delete(self, echo, monkeypatch):
+        agent_manager.create_agent("task", "hi", "gpt-3.5-turbo")
+        agent_manager.create_agent("task", "hi", "gpt-3.5-turbo")
+        restart(monkeypatch)
+        agent_manager.message_agent(0, "load")
+
+        assert agent_manager.delete_agent(0) and agent_manager.delete_agent(1)
+        assert not agent_manager.delete_agent(1)
+        assert os.listdir(agent_manager.cfg.agent_dir) == []
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import browse
+
+from fakes import FakeCompletion
+
+
+@pytest.fixture(autouse=True)
+def summary_workers(word_encoding, monkeypatch):
+    monkeypatch.setattr(browse.cfg, "summary_workers", 4)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = FakeCompletion(lambda prompt: "summary " + prompt.split('"""')[1].split()[0], 0.02)
+    monkeypatch.setattr(browse, "create_chat_completion", llm)
+    return llm
+
+
+class TestSplitText:
+
+    # Tests that chunks are filled up to the token limit and break at newlines.
+    def test_token_chunks(self):
+        text = "\n".join(["a b c"] * 5)
+        assert list(browse.split_text(text, max_tokens=8)) == ["a b c\na b c"] * 2 + ["a b c"]
+
+    # Tests that a paragraph longer than the limit is cut at token boundaries.
+    def test_long_paragraph(self):
+        chunks = list(browse.split_text(" ".join(str(i) for i in range(10)), max_tokens=4))
+        assert chunks == ["0 1 2", "3 4 5", "6 7 8", "9"]
+
+
+class TestSummarizeText:
+
+    # Tests that chunks are summarized concurrently and the summaries keep their order.
+    def test_parallel_map(self, llm):
+        text = "\n".join(f"part{i} " + "word " * (browse.CHUNK_TOKENS - 3) for i in range(8))
+        summary = browse.summarize_text(text, "question")
+
+        assert llm.most == 4
+        assert len(llm.prompts) == 9
+        assert llm.prompts[-1].startswith('"""' + "\n".join(f"summary part{i}" for i in range(8)))
+        assert summary == "summary summary"
+
+    # Tests that summaries too long for one request are summarized again before the final pass.
+    def test_hierarchical_reduce(self, llm):
+        llm.reply = lambda prompt: "long " * 600
+        text = "\n".join("word " * (browse.CHUNK_TOKENS - 2) for _ in range(8))
+        browse.summarize_text(text, "question")
+
+        # 8 chunks, then 4800 tokens of summaries in 3 chunks, then 1800 tokens in one final request
+        assert len(llm.prompts) == 8 + 3 + 1
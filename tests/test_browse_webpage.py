@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from browse import WebPage
+
+HTML = """<html><head><style>p { color: red; }</style><script>var x = 1;</script></head>
+<body><p>Some text</p>
+<a href="https://example.com/a">First</a>
+<a href="/b">Second</a>
+<a>No href</a></body></html>"""
+
+
+class TestWebPage:
+
+    # Tests that text and links come from a single download.
+    def test_single_fetch(self, mocker):
+        mock_get = mocker.patch("http_client.get", return_value=mocker.Mock(status_code=200, text=HTML))
+        page = WebPage("https://www.example.com")
+
+        assert page.text == "Some text\nFirst\nSecond\nNo href"
+        assert page.links == ["First (https://example.com/a)", "Second (/b)"]
+        assert mock_get.call_count == 1
+
+    # Tests that errors are reported by both text and links without parsing.
+    def test_error(self, mocker):
+        mocker.patch("http_client.get", return_value=mocker.Mock(status_code=500))
+        page = WebPage("https://www.example.com")
+
+        assert page.text == page.links == "Error: HTTP 500 error"
+        assert page.soup is None
+
+    # Tests that local addresses are refused without a request.
+    def test_local_file(self, mocker):
+        mock_get = mocker.patch("http_client.get")
+        assert WebPage("http://localhost:8000").error == "Error: Access to local files is restricted"
+        mock_get.assert_not_called()
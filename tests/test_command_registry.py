@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import command_registry
+from command_registry import Arg, Command, CommandError, command
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+    monkeypatch.setattr(command_registry, "COMMANDS", {})
+
+
+class TestCommand:
+
+    # Tests that the decorator registers the function with its metadata and returns it unchanged.
+    def test_register(self):
+        @command("greet", args={"name": Arg(str)}, cacheable=True, parallel_safe=True)
+        def greet(name):
+            return "hello " + name
+
+        registered = command_registry.COMMANDS["greet"]
+        assert registered.function is greet
+        assert (registered.cacheable, registered.parallel_safe, registered.needs_memory) == (True, True, False)
+        assert registered.run({"name": "bob", "reason": "ignored"}) == "hello bob"
+
+    # Tests that arguments are passed in declared order, with defaults and quoted integers converted.
+    def test_arguments(self):
+        ranged = Command("range", lambda start, stop, step: list(range(start, stop, step)),
+                         args={"start": Arg(int), "stop": Arg(int), "step": Arg(int, 1)})
+        assert ranged.run({"stop": "3", "start": 0}) == [0, 1, 2]
+
+        with pytest.raises(CommandError, match="Missing argument 'stop'"):
+            ranged.run({"start": 0})
+        with pytest.raises(CommandError, match="'start' must be int, not str"):
+            ranged.run({"start": "zero", "stop": 3})
+        with pytest.raises(CommandError, match="'start' must be int, not bool"):
+            ranged.run({"start": True, "stop": 3})
+
+    # Tests that commands without arguments accept the empty string, None or nothing as their arguments.
+    def test_no_arguments(self):
+        nothing = Command("do_nothing", lambda: "No action performed.")
+        for arguments in ("", None, {}, {"reason": "unused"}):
+            assert nothing.run(arguments) == "No action performed."
+        with pytest.raises(CommandError, match="must be an object"):
+            Command("greet", lambda name: name, args={"name": Arg(str)}).run("")
+
+    # Tests that only commands that need memory are given it.
+    def test_memory(self):
+        remember = Command("remember", lambda string, memory: memory.append(string) or "ok",
+                           args={"string": Arg(str)}, needs_memory=True)
+        memory = []
+        assert remember.run({"string": "a"}, memory) == "ok"
+        assert memory == ["a"]
+
+    # Tests that a command running past its timeout fails and errors are raised from the command.
+    def test_timeout(self):
+        with pytest.raises(CommandError, match="timed out after 0.05 seconds"):
+            Command("slow", lambda: time.sleep(1), timeout=0.05).run({})
+        assert Command("fast", lambda: "done", timeout=1).run({}) == "done"
+        with pytest.raises(ZeroDivisionError):
+            Command("broken", lambda: 1 / 0, timeout=1).run({})
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import completion_cache
+from completion_cache import CompletionCache
+from llm_backends import CachedBackend, ReplayBackend
+
+
+pytestmark = pytest.mark.usefixtures("word_encoding")
+
+
+def user(content):
+    return [{"role": "user", "content": content}]
+
+
+class TestCompletionCache:
+
+    # Tests that hits need the same request and are counted with the dollars they saved.
+    def test_hits_and_savings(self, tmp_path):
+        cache = CompletionCache(str(tmp_path / "cache.sqlite3"), 10, 60)
+        cache.put(user("hello there"), "gpt-4", 0, 100, "one two three four")
+
+        assert cache.get(user("hello there"), "gpt-4", 0, 100) == "one two three four"
+        assert cache.get(user("hello there"), "gpt-4", 0, 200) is None
+        assert cache.get(user("hello there"), "gpt-3.5-turbo", 0, 100) is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 2)
+        # 3 + 3 + 3 prompt tokens at $0.03 and 4 completion tokens at $0.06 per 1000
+        assert stats["dollars_saved"] == pytest.approx((9 * 0.03 + 4 * 0.06) / 1000)
+
+    # Tests that entries expire after the TTL.
+    def test_ttl(self, tmp_path, monkeypatch):
+        cache = CompletionCache(str(tmp_path / "cache.sqlite3"), 10, 60)
+        cache.put(user("a"), "gpt-4", 0, None, "reply")
+        now = completion_cache.time.time()
+        monkeypatch.setattr(completion_cache.time, "time", lambda: now + 61)
+        assert cache.get(user("a"), "gpt-4", 0, None) is None
+        assert cache.stats()["entries"] == 0
+
+    # Tests that the least recently used entries are evicted first.
+    def test_lru_eviction(self, tmp_path):
+        cache = CompletionCache(str(tmp_path / "cache.sqlite3"), 2, 60)
+        cache.put(user("a"), "gpt-4", 0, None, "A")
+        cache.put(user("b"), "gpt-4", 0, None, "B")
+        cache.get(user("a"), "gpt-4", 0, None)
+        cache.put(user("c"), "gpt-4", 0, None, "C")
+        assert [cache.get(user(text), "gpt-4", 0, None) for text in "abc"] == ["A", None, "C"]
+
+
+# Tests that only temperature 0 completions are answered from the cache.
+def test_cached_backend(tmp_path):
+    calls = []
+
+    class CountingBackend(ReplayBackend):
+        def create_chat_completion(self, messages, model=None, temperature=None, max_tokens=None):
+            calls.append(temperature)
+            return super().create_chat_completion(messages, model, temperature, max_tokens)
+
+    backend = CachedBackend(
+        CountingBackend(str(tmp_path / "missing.jsonl")),
+        CompletionCache(str(tmp_path / "cache.sqlite3"), 10, 60))
+    for _ in range(2):
+        backend.create_chat_completion(user("a"), "gpt-4", temperature=0)
+        backend.create_chat_completion(user("a"), "gpt-4", temperature=0.5)
+    assert "".join(backend.stream_chat_completion(user("a"), "gpt-4", temperature=0)) \
+        == backend.create_chat_completion(user("a"), "gpt-4", temperature=0)
+    assert calls == [0, 0.5, 0.5]
@@ -0,0 +1,56 @@
+import os
+import sys
+
+from bs4 import BeautifulSoup
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from content_extractor import extract_text, remove_duplicate_lines
+
+PARAGRAPH = "This sentence is part of the article, and it is long enough to be scored as content. " * 2
+
+PAGE = f"""<html><body>
+<div class="cookie-banner"><p>We use cookies to improve your experience, by continuing you accept them.</p></div>
+<nav><a href="/">Home</a> <a href="/news">News</a></nav>
+<div class="layout">
+  <article><h1>Headline</h1><div class="story-body">
+    <p>First. {PARAGRAPH}</p>
+    <p>Second. {PARAGRAPH}</p>
+    <p>Third. {PARAGRAPH}</p>
+  </div></article>
+  <div class="sidebar"><p>Most read: a story about something else entirely, with many words.</p></div>
+</div>
+<footer><p>Copyright, all rights reserved, no part of this site may be reproduced.</p></footer>
+</body></html>"""
+
+
+class TestExtractText:
+
+    # Tests that the article and its title are kept without the banner, navigation, sidebar and footer.
+    def test_main_content(self):
+        text = extract_text(BeautifulSoup(PAGE, "html.parser"))
+
+        assert text.split("\n") == ["Headline"] + [f"{n}. {PARAGRAPH.strip()}" for n in ("First", "Second", "Third")]
+
+    # Tests that short pages are kept whole.
+    def test_short_page(self):
+        soup = BeautifulSoup("<html><body><p>Short</p>\n<a href='/a'>Link</a></body></html>", "html.parser")
+        assert extract_text(soup) == "Short\nLink"
+
+    # Tests that hidden elements are skipped.
+    def test_hidden(self):
+        soup = BeautifulSoup("<body><p>Shown</p><p style='display: none'>Hidden</p><p hidden>Also hidden</p></body>",
+                             "html.parser")
+        assert extract_text(soup) == "Shown"
+
+
+# Tests that lines differing only in case, punctuation and relative dates are dropped after the first.
+def test_remove_duplicate_lines():
+    lines = ["Share", "Posted 3 days ago", "Text", "share!", "Posted 9 days ago", "2023", "2024"]
+    assert remove_duplicate_lines(lines) == ["Share", "Posted 3 days ago", "Text", "2023", "2024"]
+
+
+# Tests that lines differing by a number that is part of the content are kept.
+def test_keep_numbered_lines():
+    lines = ["Step 1: install the package", "Step 2: install the package",
+             "Python 3.10 released", "Python 3.11 released", "Total: $20", "Total: $25"]
+    assert remove_duplicate_lines(lines) == lines
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from context_window import ContextWindow, trim_memories
+
+
+pytestmark = pytest.mark.usefixtures("word_encoding")
+
+
+def message(words):
+    # 3 tokens per message for gpt-4, 1 for the role and one per word
+    return {"role": "user", "content": " ".join(["word"] * words)}
+
+
+class TestContextWindow:
+
+    # Tests that only new history messages are added and the budget keeps the newest ones.
+    def test_sync_and_messages_within(self):
+        history = [message(1), message(2), message(3)]
+        window = ContextWindow("gpt-4")
+        window.sync(history, 100)
+        assert window.tokens == 5 + 6 + 7
+
+        history.append(message(4))
+        window.sync(history, 100)
+        assert len(window) == 4
+
+        messages, tokens = window.messages_within(16)
+        assert messages == history[2:]
+        assert tokens == 15
+
+    # Tests that messages that can never fit are evicted from the front.
+    def test_eviction(self):
+        history = [message(1), message(2), message(3)]
+        window = ContextWindow("gpt-4")
+        window.sync(history, 13)
+        assert len(window) == 2
+        assert window.messages_within(100) == (history[1:], 13)
+
+    # Tests that a replaced history is synced from scratch.
+    def test_history_replaced(self):
+        window = ContextWindow("gpt-4")
+        window.sync([message(1), message(2)], 100)
+        window.sync([message(3)], 100)
+        assert window.messages_within(100) == ([message(3)], 7)
+
+
+# Tests that the most relevant memories are kept until the budget runs out.
+def test_trim_memories():
+    memories = ["one two", "three", "four five six"]
+    assert trim_memories(memories, 4, "gpt-4") == ["one two", "three"]
+    assert trim_memories(memories, 100, "gpt-4") == memories
+    assert trim_memories(memories, 1, "gpt-4") == []
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import browse
+import crawler
+from crawler import Crawler
+
+SITE = {
+    "https://a.com/": '<a href="/one">One</a> <a href="two#top">Two</a> <a href="https://b.com/">B</a>',
+    "https://a.com/one": '<a href="/three">Three</a> <a href="/">Home</a>',
+    "https://a.com/two": "Two",
+    "https://a.com/three": "Three",
+    "https://b.com/": "B",
+}
+
+
+@pytest.fixture
+def site(mocker, monkeypatch):
+    """Serves SITE slowly and records the URLs and the most requests each host had at once."""
+    state = {"urls": [], "running": {}, "most": {}}
+    lock = threading.Lock()
+
+    def get(url):
+        host = urlparse(url).netloc
+        with lock:
+            state["urls"].append(url)
+            state["running"][host] = state["running"].get(host, 0) + 1
+            state["most"][host] = max(state["most"].get(host, 0), state["running"][host])
+        time.sleep(0.02)
+        with lock:
+            state["running"][host] -= 1
+        if url not in SITE:
+            return mocker.Mock(status_code=404)
+        return mocker.Mock(status_code=200, text=f"<html><body>{SITE[url]}</body></html>")
+
+    mocker.patch("http_client.get", side_effect=get)
+    monkeypatch.setattr(browse, "summarize_text", lambda text, question: f"summary of {text.split()[0]}")
+    return state
+
+
+class TestCrawler:
+
+    # Tests that links are followed breadth first to the given depth on the seed's host only.
+    def test_depth(self, site):
+        summaries = crawler.crawl(["https://a.com/"], "question", depth=2)
+
+        assert list(summaries) == ["https://a.com/", "https://a.com/one", "https://a.com/two", "https://a.com/three"]
+        assert summaries["https://a.com/two"] == "summary of Two"
+        assert sorted(site["urls"]) == sorted(summaries)
+
+    # Tests that a list of URLs is fetched concurrently with a limit per host.
+    def test_per_host_limit(self, site):
+        urls = [f"https://a.com/missing{i}" for i in range(6)] + ["https://b.com/"]
+        summaries = asyncio.run(Crawler("question", per_host=2, workers=8).crawl(urls))
+
+        assert site["most"]["a.com"] == 2
+        assert summaries["https://a.com/missing0"] == "Error: HTTP 404 error"
+        assert summaries["https://b.com/"] == "summary of B"
+
+    # Tests that a crawl stops at max_pages.
+    def test_max_pages(self, site):
+        summaries = asyncio.run(Crawler("question", depth=3, max_pages=2).crawl(["https://a.com/"]))
+        assert list(summaries) == ["https://a.com/", "https://a.com/one"]
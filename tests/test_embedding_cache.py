@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from memory import base
+from memory.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache:
+
+    # Tests that lookups ignore whitespace differences and are counted as hits/misses.
+    def test_hits_and_misses(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), 10)
+        cache.put_many(["hello  world"], "model", [[1.0, 2.0]])
+
+        assert cache.get_many(["hello world", "other"], "model") == [[1.0, 2.0], None]
+        assert cache.get_many(["hello world"], "other-model") == [None]
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+    # Tests that the least recently used entries are evicted first.
+    def test_lru_eviction(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), 2)
+        cache.put_many(["a"], "model", [[1.0]])
+        cache.put_many(["b"], "model", [[2.0]])
+        cache.get_many(["a"], "model")
+        cache.put_many(["c"], "model", [[3.0]])
+
+        assert cache.get_many(["a", "b", "c"], "model") == [[1.0], None, [3.0]]
+
+
+# Tests that get_ada_embeddings only requests texts missing from the cache, once each.
+def test_get_ada_embeddings_uses_cache(tmp_path, monkeypatch):
+    requested = []
+
+    def fake_create_embeddings(texts):
+        requested.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(base, "_embedding_cache", EmbeddingCache(str(tmp_path / "cache.sqlite3"), 10))
+    monkeypatch.setattr(base, "create_embeddings", fake_create_embeddings)
+
+    assert base.get_ada_embeddings(["ab", "abc", "ab"]) == [[2.0], [3.0], [2.0]]
+    assert base.get_ada_embeddings(["abc", "abcd"]) == [[3.0], [4.0]]
+    assert requested == [["ab", "abc"], ["abcd"]]
@@ -0,0 +1,92 @@
+import io
+import os
+import sys
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import http_client
+from http_client import PageCache
+
+
+def make_response(status_code, body=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(body)
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.encoding = "utf-8"
+    return response
+
+
+class FakeSession:
+    """Serves queued responses and records the headers of each request."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers, stream, timeout):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = PageCache(str(tmp_path / "http_cache.sqlite3"), 1000)
+    monkeypatch.setattr(http_client, "_page_cache", cache)
+    monkeypatch.setattr(http_client.cfg, "http_cache", True)
+    monkeypatch.setattr(http_client.cfg, "http_max_body_bytes", 100)
+    return cache
+
+
+def use_session(monkeypatch, *responses):
+    session = FakeSession(*responses)
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+    return session
+
+
+class TestGet:
+
+    # Tests that a cached page is revalidated with its validators and reused on 304.
+    def test_revalidation(self, cache, monkeypatch):
+        session = use_session(
+            monkeypatch,
+            make_response(200, b"<p>page</p>", {"ETag": '"v1"', "Last-Modified": "Mon, 01 May 2023 00:00:00 GMT"}),
+            make_response(304))
+
+        assert http_client.get("https://example.com").text == "<p>page</p>"
+        assert http_client.get("https://example.com").text == "<p>page</p>"
+        assert session.requests == [
+            {}, {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 May 2023 00:00:00 GMT"}]
+
+    # Tests that a page is reused without a request while its max-age lasts.
+    def test_fresh_page(self, cache, monkeypatch):
+        session = use_session(monkeypatch, make_response(200, b"page", {"Cache-Control": "max-age=60"}))
+        http_client.get("https://example.com")
+        assert http_client.get("https://example.com").content == b"page"
+        assert len(session.requests) == 1
+
+    # Tests that pages without validators, marked no-store or cut short are not cached.
+    def test_not_cached(self, cache, monkeypatch):
+        use_session(
+            monkeypatch,
+            make_response(200, b"plain"),
+            make_response(200, b"secret", {"ETag": '"a"', "Cache-Control": "no-store"}),
+            make_response(200, b"x" * 150, {"ETag": '"b"'}))
+
+        assert http_client.get("https://example.com/plain").content == b"plain"
+        http_client.get("https://example.com/secret")
+        assert http_client.get("https://example.com/large").content == b"x" * 100
+        assert [cache.get("https://example.com/" + path) for path in ("plain", "secret", "large")] == [None] * 3
+
+
+# Tests that the least recently used pages are evicted once the bodies exceed the size limit.
+def test_size_bounded_eviction(tmp_path):
+    cache = PageCache(str(tmp_path / "http_cache.sqlite3"), 10)
+    cache.put("a", {}, None, b"aaaa")
+    cache.put("b", {}, None, b"bbbb")
+    cache.get("a")
+    cache.put("c", {}, None, b"cccc")
+    assert [cache.get(url) is not None for url in "abc"] == [True, False, True]
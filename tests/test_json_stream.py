@@ -0,0 +1,59 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from json_stream import JsonStreamParser
+
+REPLY = json.dumps({
+    "thoughts": {"text": "I should {search}, \"quickly\"", "plan": ["- a", "- b"]},
+    "command": {"name": "google", "args": {"input": "a, b}"}},
+    "count": 3,
+}, indent=4)
+
+
+def feed_in_chunks(parser, text, size):
+    members = []
+    for i in range(0, len(text), size):
+        members.append(parser.feed(text[i:i + size]))
+    return members
+
+
+class TestJsonStreamParser:
+
+    # Tests that each member is returned once, as soon as its value closes, whatever the chunking.
+    def test_members_in_order(self):
+        for size in (1, 3, 7, len(REPLY)):
+            parser = JsonStreamParser()
+            members = [member for chunk in feed_in_chunks(parser, REPLY, size) for member in chunk]
+            assert members == list(json.loads(REPLY).items())
+            assert parser.done
+
+    # Tests that the command is available before the rest of the reply arrives.
+    def test_command_before_end(self):
+        parser = JsonStreamParser()
+        end_of_command = REPLY.index('"count"')
+        members = parser.feed(REPLY[:end_of_command])
+        assert [key for key, _ in members] == ["thoughts", "command"]
+        assert not parser.done
+
+    # Tests that text around the object is ignored.
+    def test_surrounding_text(self):
+        parser = JsonStreamParser()
+        assert parser.feed('Sure! {"a": [1, 2], "c": "d"} trailing') == [("a", [1, 2]), ("c", "d")]
+        assert parser.done
+
+    # Tests that invalid members are skipped, and an invalid object does not end the stream.
+    def test_invalid_members(self):
+        parser = JsonStreamParser()
+        members = parser.feed('{"a": [1, 2], "b": nope, "c": "d"}')
+        assert members == [("a", [1, 2]), ("c", "d")]
+        assert not parser.done
+
+    # Tests that braces in prose before the reply do not end the stream.
+    def test_braces_in_leading_prose(self):
+        for size in (1, 5, 100):
+            parser = JsonStreamParser()
+            chunks = feed_in_chunks(parser, 'Here is {my} answer: {"a": 1, "b": {"c": 2}}', size)
+            assert [member for chunk in chunks for member in chunk] == [("a", 1), ("b", {"c": 2})]
+            assert parser.done
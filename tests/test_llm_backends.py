@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from llm_backends import DEFAULT_REPLY, RecordingBackend, ReplayBackend
+
+
+def user(content):
+    return [{"role": "user", "content": content}]
+
+
+class TestReplayBackend:
+
+    # Tests that recorded messages get their response and other requests cycle through the recording.
+    def test_replays_recording(self, tmp_path):
+        path = tmp_path / "replay.jsonl"
+        with open(path, "w") as f:
+            f.write(json.dumps({"messages": user("a"), "response": "first"}) + "\n")
+            f.write(json.dumps({"messages": user("b"), "response": "second"}) + "\n")
+        backend = ReplayBackend(str(path))
+
+        assert backend.create_chat_completion(user("b")) == "second"
+        assert [backend.create_chat_completion(user("other")) for _ in range(3)] == ["first", "second", "first"]
+        assert "".join(backend.stream_chat_completion(user("a"))) == "first"
+
+    # Tests that a missing recording serves a valid do_nothing command.
+    def test_default_reply(self, tmp_path):
+        backend = ReplayBackend(str(tmp_path / "missing.jsonl"))
+        reply = json.loads(backend.create_chat_completion(user("a")))
+        assert reply["command"]["name"] == "do_nothing"
+        assert backend.create_chat_completion(user("a")) == DEFAULT_REPLY
+
+    # Tests that embeddings are deterministic unit vectors of the model's dimension.
+    def test_embeddings(self, tmp_path):
+        backend = ReplayBackend(str(tmp_path / "missing.jsonl"))
+        first, second = backend.create_embeddings(["hello", "world"], "text-embedding-ada-002")
+        assert len(first) == 1536
+        assert np.isclose(np.linalg.norm(first), 1.0)
+        assert backend.create_embeddings(["hello"], "text-embedding-ada-002") == [first]
+        assert first != second
+
+
+# Tests that recorded completions, streamed or not, can be replayed.
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    live = ReplayBackend(str(tmp_path / "missing.jsonl"))
+    recorder = RecordingBackend(live, path)
+    recorder.create_chat_completion(user("a"))
+    stream = recorder.stream_chat_completion(user("b"))
+    next(stream)
+    stream.close()
+
+    replay = ReplayBackend(path)
+    assert replay.create_chat_completion(user("a")) == DEFAULT_REPLY
+    assert replay.create_chat_completion(user("b")) == DEFAULT_REPLY[:4]
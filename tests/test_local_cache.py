@@ -0,0 +1,210 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import orjson
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from config import Singleton
+from memory.local import LocalCache
+from memory.ann import IVFIndex
+from memory.segments import SegmentStore
+
+from fakes import FakeConfig, fake_embedding, fake_embeddings
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("memory.local.get_ada_embedding", fake_embedding)
+    Singleton._instances.pop(LocalCache, None)
+    yield lambda: LocalCache(FakeConfig())
+    Singleton._instances.pop(LocalCache, None)
+
+
+class TestLocalCache:
+
+    # Tests that added texts are retrievable and survive a reload from disk.
+    def test_add_and_reload(self, cache):
+        memory = cache()
+        for text in ["apples", "bananas", "cherries"]:
+            memory.add(text)
+        assert memory.get_relevant("bananas", 1) == ["bananas"]
+
+        Singleton._instances.pop(LocalCache, None)
+        reloaded = cache()
+        assert reloaded.store.read_texts() == ["apples", "bananas", "cherries"]
+        assert reloaded.get_relevant("cherries", 1) == ["cherries"]
+
+    # Tests that batched queries return the same results as individual ones.
+    def test_get_relevant_many(self, cache, monkeypatch):
+        monkeypatch.setattr("memory.local.get_ada_embeddings", fake_embeddings)
+        memory = cache()
+        for text in ["apples", "bananas", "cherries", "dates"]:
+            memory.add(text)
+
+        queries = ["dates", "apples", "cherries"]
+        assert memory.get_relevant_many(queries, 2) == \
+            [memory.get_relevant(query, 2) for query in queries]
+        assert [results[0] for results in memory.get_relevant_many(queries, 10)] == queries
+
+    # Tests that queued writes are all embedded and visible to the next query.
+    def test_add_async(self, cache, monkeypatch):
+        batches = []
+
+        def recording_embeddings(texts):
+            batches.append(list(texts))
+            return fake_embeddings(texts)
+
+        monkeypatch.setattr("memory.base.get_ada_embeddings", recording_embeddings)
+        monkeypatch.setattr("memory.local.get_ada_embeddings", recording_embeddings)
+        memory = cache()
+        for text in ["apples", "bananas", "Command Error: nope"]:
+            memory.add_async(text)
+
+        assert memory.get_relevant("bananas", 1) == ["bananas"]
+        assert [text for batch in batches for text in batch] == ["apples", "bananas"]
+        assert memory.get_stats()[0] == 2
+
+    # Tests that bulk_add embeds in batches and keeps the input order.
+    def test_bulk_add(self, cache, monkeypatch):
+        monkeypatch.setattr("memory.base.get_ada_embeddings", fake_embeddings)
+        memory = cache()
+        texts = (f"document {i}" for i in range(25))
+
+        assert memory.bulk_add(texts, batch_size=4, workers=2) == 25
+        assert memory.store.read_texts() == [f"document {i}" for i in range(25)]
+        assert memory.get_relevant("document 7", 1) == ["document 7"]
+
+    # Tests that clear() also removes the rows stored on disk.
+    def test_clear(self, cache):
+        memory = cache()
+        memory.add("apples")
+        memory.clear()
+
+        Singleton._instances.pop(LocalCache, None)
+        assert cache().get_stats()[0] == 0
+
+    # Tests that the old JSON file is imported once, with its reversed rows fixed.
+    def test_migrate_json(self, cache):
+        texts = ["apples", "bananas"]
+        embeddings = np.stack([fake_embedding(t) for t in reversed(texts)])
+        with open("test-memory.json", "wb") as f:
+            f.write(orjson.dumps(
+                {"texts": texts, "embeddings": embeddings},
+                option=orjson.OPT_SERIALIZE_NUMPY,
+            ))
+
+        memory = cache()
+        assert memory.store.read_texts() == texts
+        assert memory.get_relevant("apples", 1) == ["apples"]
+        assert not os.path.exists("test-memory.json")
+        assert os.path.exists("test-memory.json.migrated")
+
+
+class TestSegmentStore:
+
+    # Tests that sealed segments are merged in the background without losing rows.
+    def test_compaction(self, tmp_path):
+        store = SegmentStore(str(tmp_path), 4, segment_rows=2, compact_after=2)
+        texts = [f"text {i}" for i in range(7)]
+        vectors = np.arange(28, dtype=np.float32).reshape(7, 4)
+        for text, vector in zip(texts, vectors):
+            store.append(text, vector)
+        store.wait_for_compaction()
+
+        assert len(store.segments) < 4
+        assert store.read_texts() == texts
+        assert np.array_equal(store.read_embeddings(), vectors)
+
+        store.close()
+        reopened = SegmentStore(str(tmp_path), 4)
+        assert reopened.read_texts() == texts
+
+    # Tests that a torn write at the tail of a segment is discarded on load.
+    def test_recover_partial_write(self, tmp_path):
+        store = SegmentStore(str(tmp_path), 4)
+        store.append("kept", np.ones(4, dtype=np.float32))
+        store.close()
+        with open(store.segments[-1].path("vec"), "ab") as f:
+            f.write(b"\x00" * 6)
+
+        reopened = SegmentStore(str(tmp_path), 4)
+        assert reopened.read_texts() == ["kept"]
+        assert reopened.read_embeddings().shape == (1, 4)
+
+    # Tests that the active segment grows by doubling and rows are read across segments.
+    def test_growth_and_random_reads(self, tmp_path):
+        store = SegmentStore(str(tmp_path), 4, segment_rows=100, compact_after=10)
+        texts = [f"text {i}" for i in range(150)]
+        vectors = np.arange(600, dtype=np.float32).reshape(150, 4)
+        for text, vector in zip(texts, vectors):
+            store.append(text, vector)
+
+        assert store.segments[0].sealed
+        assert store.segments[-1].capacity == 64
+        assert store.read_texts([149, 3, 120]) == ["text 149", "text 3", "text 120"]
+        assert np.array_equal(store.read_embeddings(), vectors)
+
+    # Tests that reads running alongside appends and compactions never see deleted segments.
+    def test_concurrent_read_and_compact(self, tmp_path):
+        store = SegmentStore(str(tmp_path), 4, segment_rows=8, compact_after=2)
+        store.extend(["text 0"], np.zeros((1, 4), dtype=np.float32))
+        errors = []
+        done = threading.Event()
+
+        def read():
+            rng = np.random.default_rng(0)
+            while not done.is_set():
+                try:
+                    rows = rng.integers(0, len(store), size=5).tolist()
+                    assert store.read_texts(rows) == [f"text {row}" for row in rows]
+                    assert np.array_equal(store.read_embeddings(rows)[:, 0], rows)
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for reader in readers:
+            reader.start()
+        for i in range(1, 2000):
+            store.append(f"text {i}", np.full(4, i, dtype=np.float32))
+        done.set()
+        for reader in readers:
+            reader.join()
+        store.wait_for_compaction()
+
+        assert errors == []
+        assert store.read_texts([1999]) == ["text 1999"]
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            [f"{segment.segment_id:06d}.{ext}" for segment in store.segments for ext in ("vec", "txt", "idx")]
+            + ["manifest.json"])
+
+
+class TestIVFIndex:
+
+    # Tests that the IVF index trains once enough rows exist, finds exact matches and reloads.
+    def test_search_and_reload(self, tmp_path):
+        rng = np.random.default_rng(1)
+        vectors = rng.standard_normal((300, 8)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        store = SegmentStore(str(tmp_path), 8)
+        index = IVFIndex(store, nlist=4, nprobe=2)
+        for row, vector in enumerate(vectors):
+            store.append(str(row), vector)
+            index.add(row, vector[np.newaxis, :])
+
+        assert index.centroids is not None
+        assert sum(len(rows) for rows in index.lists) == 300
+        for row in (0, 150, 299):
+            assert index.search(vectors[row], 1)[0] == row
+        batched = index.search_many(vectors[[0, 150, 299]], 3)
+        assert [rows[0] for rows in batched] == [0, 150, 299]
+
+        reloaded = IVFIndex(store, nlist=4, nprobe=2)
+        # Trained on the first 128 rows, so the next training is due at 512 rather than 1200
+        assert reloaded.trained_rows == index.trained_rows == 128
+        assert [list(rows) for rows in reloaded.lists] == \
+            [list(rows) for rows in index.lists]
@@ -0,0 +1,92 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from config import Singleton
+from memory.base import EMBED_DIM
+from memory.pinecone import PineconeMemory, UPSERT_BATCH_SIZE, vector_id
+
+from fake_pinecone import FakePinecone
+from fakes import FakeConfig, fake_embedding, fake_embeddings
+
+
+@pytest.fixture
+def fake_pinecone(monkeypatch):
+    fake = FakePinecone()
+    monkeypatch.setattr("memory.pinecone.pinecone", fake)
+    monkeypatch.setattr("memory.pinecone.get_ada_embedding", fake_embedding)
+    monkeypatch.setattr("memory.pinecone.get_ada_embeddings", fake_embeddings)
+    monkeypatch.setattr("memory.base.get_ada_embeddings", fake_embeddings)
+    Singleton._instances.pop(PineconeMemory, None)
+    yield fake
+    Singleton._instances.pop(PineconeMemory, None)
+
+
+def new_memory(namespace="agent-1"):
+    Singleton._instances.pop(PineconeMemory, None)
+    cfg = FakeConfig()
+    cfg.pinecone_namespace = namespace
+    return PineconeMemory(cfg)
+
+
+class TestPineconeMemory:
+
+    # Tests that a restarted memory keeps earlier vectors instead of overwriting their ids.
+    def test_restart_keeps_vectors(self, fake_pinecone):
+        memory = new_memory()
+        memory.add("apples")
+        memory.add("bananas")
+        memory.flush()
+
+        restarted = new_memory()
+        restarted.add("cherries")
+        restarted.add("apples")
+        stored = fake_pinecone.indexes["auto-gpt"].namespaces["agent-1"]
+        assert restarted.get_relevant("bananas", 1) == ["bananas"]
+        assert sorted(stored) == sorted(vector_id(text) for text in ["apples", "bananas", "cherries"])
+
+    # Tests that writes are buffered and upserted in requests of at most UPSERT_BATCH_SIZE.
+    def test_batched_upserts(self, fake_pinecone):
+        memory = new_memory()
+        added = memory.bulk_add((f"text {i}" for i in range(250)), batch_size=30)
+        index = fake_pinecone.indexes["auto-gpt"]
+        assert index.upsert_requests == [UPSERT_BATCH_SIZE, UPSERT_BATCH_SIZE]
+
+        stats = memory.get_stats()
+        assert added == 250
+        assert stats["namespaces"]["agent-1"]["vector_count"] == 250
+        assert index.upsert_requests == [UPSERT_BATCH_SIZE, UPSERT_BATCH_SIZE, 50]
+
+    # Tests that agents in different namespaces neither see nor clear each other's memories.
+    def test_namespaces(self, fake_pinecone):
+        first = new_memory("agent-1")
+        first.add("apples")
+        first.flush()
+        second = new_memory("agent-2")
+        second.add("bananas")
+
+        assert second.get_relevant("apples", 5) == ["bananas"]
+        second.clear()
+        assert new_memory("agent-1").get_relevant("bananas", 5) == ["apples"]
+
+    # Tests that relevant memories come back best first, like the other providers.
+    def test_relevant_best_first(self, fake_pinecone, monkeypatch):
+        def embedding_by_length(text):
+            # Texts further apart in length are further apart in angle
+            vector = np.zeros(EMBED_DIM, dtype=np.float32)
+            vector[0], vector[1] = 1, len(text) - 1
+            return vector / np.linalg.norm(vector)
+
+        embed_many = lambda texts: [embedding_by_length(text) for text in texts]
+        monkeypatch.setattr("memory.pinecone.get_ada_embedding", embedding_by_length)
+        monkeypatch.setattr("memory.pinecone.get_ada_embeddings", embed_many)
+        monkeypatch.setattr("memory.base.get_ada_embeddings", embed_many)
+        memory = new_memory()
+        for text in ("ccc", "a", "bb"):
+            memory.add(text)
+
+        assert memory.get_relevant("a", 3) == ["a", "bb", "ccc"]
+        assert memory.get_relevant_many(["ccc", "a"], 2) == [["ccc", "bb"], ["a", "bb"]]
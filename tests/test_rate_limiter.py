@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+import time
+
+import openai
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from rate_limiter import (PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, RateLimiter, TokenBucket,
+                          request_priority)
+
+
+def flaky(failures, result="ok"):
+    """Returns a function that raises a rate limit error `failures` times, then returns result."""
+    calls = []
+
+    def function():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise openai.error.RateLimitError("slow down")
+        return result
+    function.calls = calls
+    return function
+
+
+class TestRateLimiter:
+
+    # Tests that the bucket waits for the refill of the missing tokens, capped at its size.
+    def test_token_bucket_wait_time(self):
+        bucket = TokenBucket(600)
+        bucket.take(600)
+        now = bucket._updated
+        assert bucket.wait_time(5, now) == pytest.approx(0.5)
+        assert bucket.wait_time(6000, now) == pytest.approx(60)
+
+    # Tests that requests waiting for quota are served by priority.
+    def test_priority_order(self):
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10 ** 6)
+        limiter.requests.take(600)
+        served = []
+
+        def request(name, priority):
+            with request_priority(priority):
+                limiter.acquire(1)
+            served.append(name)
+
+        threads = [threading.Thread(target=request, args=("low", PRIORITY_LOW))]
+        threads[0].start()
+        time.sleep(0.02)
+        for name, priority in (("normal", PRIORITY_NORMAL), ("high", PRIORITY_HIGH)):
+            threads.append(threading.Thread(target=request, args=(name, priority)))
+            threads[-1].start()
+        for thread in threads:
+            thread.join()
+        assert served == ["high", "normal", "low"]
+
+    # Tests that rate limit errors are retried after backing off, and slow the refill rate.
+    def test_retries_with_backoff(self):
+        limiter = RateLimiter(6000, 10 ** 6, max_retries=3, base_delay=0.01)
+        function = flaky(2)
+        assert limiter.call(function, 1) == "ok"
+        assert len(function.calls) == 3
+        assert limiter.requests.scale == pytest.approx(0.25 + 0.05)
+
+    # Tests that the error is raised once the retries run out.
+    def test_gives_up(self):
+        limiter = RateLimiter(6000, 10 ** 6, max_retries=1, base_delay=0.01)
+        with pytest.raises(openai.error.RateLimitError):
+            limiter.call(flaky(5), 1)
+
+    # Tests that a stream that fails before its first chunk is reopened.
+    def test_stream_retries(self):
+        limiter = RateLimiter(6000, 10 ** 6, base_delay=0.01)
+        open_stream = flaky(1, result=iter(["a", "b"]))
+        assert list(limiter.stream(open_stream, 1)) == ["a", "b"]
@@ -0,0 +1,119 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+# The Redis provider is optional, like in memory/__init__.py
+redismem = pytest.importorskip("memory.redismem")
+from memory.base import EMBED_DIM
+
+from fakes import FakeConfig
+
+
+def flat_config():
+    cfg = FakeConfig()
+    cfg.redis_vector_algorithm = "FLAT"
+    cfg.redis_initial_cap = 1000
+    return cfg
+
+
+class FakeRedis:
+    """Answers FT._LIST and records the indexes created."""
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.created = []
+
+    def execute_command(self, command):
+        assert command == "FT._LIST"
+        return self.indexes
+
+    def ft(self, name):
+        return SimpleNamespace(
+            create_index=lambda fields, definition: self.created.append((name, fields, definition)))
+
+
+class TestBuildFilter:
+
+    # Tests that no filter matches everything.
+    def test_no_filter(self):
+        assert redismem.build_filter() == "*"
+
+    # Tests that tags are escaped so punctuation and spaces are not parsed as query syntax.
+    def test_tags_escaped(self):
+        assert redismem.build_filter(["web-page", "a b", "plain"]) == r"(@tags:{web\-page | a\ b | plain})"
+
+    # Tests that a date range with one end left open is unbounded on that side.
+    def test_open_ended_ranges(self):
+        assert redismem.build_filter(since=100) == "(@created_at:[100 +inf])"
+        assert redismem.build_filter(until=200.5) == "(@created_at:[-inf 200.5])"
+        assert redismem.build_filter(["news"], 100, 200) == "(@tags:{news} @created_at:[100 200])"
+
+
+class TestSchemaAndQuery:
+
+    # Tests that HNSW indexes get their graph parameters and FLAT indexes do not.
+    def test_schema_attributes(self):
+        hnsw = redismem.build_schema(FakeConfig())
+        assert [field.name for field in hnsw] == ["data", "tags", "created_at", "embedding"]
+        assert hnsw[-1].args == [
+            "VECTOR", "HNSW", 12, "TYPE", "FLOAT32", "DIM", EMBED_DIM, "DISTANCE_METRIC", "COSINE",
+            "M", 16, "EF_CONSTRUCTION", 200, "EF_RUNTIME", 10]
+
+        flat = redismem.build_schema(flat_config())
+        assert flat[-1].args == [
+            "VECTOR", "FLAT", 8, "TYPE", "FLOAT32", "DIM", EMBED_DIM, "DISTANCE_METRIC", "COSINE",
+            "INITIAL_CAP", 1000]
+
+    # Tests that EF_RUNTIME is sent with HNSW queries only, after the filter.
+    def test_knn_query(self):
+        query = redismem.build_knn_query(FakeConfig(), 3, "(@tags:{news})")
+        assert query.query_string() == \
+            "(@tags:{news})=>[KNN 3 @embedding $vector EF_RUNTIME 10 AS vector_score]"
+        assert redismem.build_knn_query(flat_config(), 5).query_string() == \
+            "*=>[KNN 5 @embedding $vector AS vector_score]"
+
+
+class TestParseSearchData:
+
+    # Tests that parsed results are read from their documents.
+    def test_parsed_result(self):
+        response = SimpleNamespace(docs=[SimpleNamespace(data="apples"), SimpleNamespace(data="bananas")])
+        assert redismem.parse_search_data(response) == ["apples", "bananas"]
+
+    # Tests that raw pipelined replies with bytes keys and values are decoded.
+    def test_raw_reply(self):
+        response = [
+            2,
+            b"auto-gpt:0", [b"vector_score", b"0.1", b"data", "café".encode("utf-8")],
+            b"auto-gpt:1", ["data", "bananas", "vector_score", "0.2"],
+        ]
+        assert redismem.parse_search_data(response) == ["café", "bananas"]
+        assert redismem.parse_search_data([0]) == []
+
+
+class TestCreateIndex:
+
+    def memory(self, indexes):
+        memory = redismem.RedisMemory.__new__(redismem.RedisMemory)
+        memory.cfg = FakeConfig()
+        memory.redis = FakeRedis(indexes)
+        return memory
+
+    # Tests that an existing index, listed by name as bytes, is kept.
+    def test_existing_index_kept(self):
+        memory = self.memory([b"other", b"test-memory"])
+        memory._create_index()
+        assert memory.redis.created == []
+
+    # Tests that a missing index is created over the memory's key prefix.
+    def test_missing_index_created(self):
+        memory = self.memory([b"other"])
+        memory._create_index()
+        [(name, fields, definition)] = memory.redis.created
+        assert name == "test-memory"
+        assert [field.name for field in fields] == ["data", "tags", "created_at", "embedding"]
+        assert definition.args[:4] == ["ON", "HASH", "PREFIX", 1]
+        assert definition.args[4] == "test-memory:"
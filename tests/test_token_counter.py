@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+import token_counter
+
+
+class FakeEncoding:
+    """Splits on whitespace and records every string it encodes."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+
+@pytest.fixture
+def encoding(monkeypatch):
+    fake = FakeEncoding()
+    loaded = []
+
+    def encoding_for_model(model):
+        loaded.append(model)
+        return fake
+
+    monkeypatch.setattr(token_counter.tiktoken, "encoding_for_model", encoding_for_model)
+    token_counter.get_encoding.cache_clear()
+    token_counter._count_single_message.cache_clear()
+    fake.loaded = loaded
+    yield fake
+    token_counter.get_encoding.cache_clear()
+    token_counter._count_single_message.cache_clear()
+
+
+class TestTokenCounter:
+
+    # Tests the count for a known model snapshot, including the name adjustment.
+    def test_count_message_tokens(self, encoding):
+        messages = [
+            {"role": "system", "content": "you are a helpful bot"},
+            {"role": "user", "name": "bob", "content": "hello"},
+        ]
+        # 3 per message, 1 per name, 3 to prime the reply, plus one token per word
+        assert token_counter.count_message_tokens(messages, "gpt-4") == 3 + 6 + 3 + 3 + 1 + 3
+
+    # Tests that the encoder is resolved once and only new messages are encoded on later calls.
+    def test_counts_are_memoized(self, encoding):
+        history = [{"role": "user", "content": f"message number {i}"} for i in range(10)]
+        first = token_counter.count_message_tokens(history, "gpt-3.5-turbo")
+        encoded = len(encoding.encoded)
+
+        history.append({"role": "assistant", "content": "a reply"})
+        second = token_counter.count_message_tokens(history, "gpt-3.5-turbo")
+
+        assert second == first + 4 + 3
+        assert len(encoding.encoded) == encoded + 2
+        assert encoding.loaded == ["gpt-3.5-turbo-0301"]
+
+    # Tests that unsupported models still raise.
+    def test_unknown_model(self, encoding):
+        with pytest.raises(NotImplementedError):
+            token_counter.count_message_tokens([{"role": "user", "content": "hi"}], "davinci")
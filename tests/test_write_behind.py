@@ -0,0 +1,44 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+from memory.write_behind import WriteBehindQueue
+
+
+class BlockingWriter:
+    """Records each batch and holds the first write until released."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+
+
+class TestWriteBehindQueue:
+
+    # Tests that a text queued while the writer is idle is written without waiting for a batch.
+    def test_writes_at_once_when_idle(self):
+        writer = BlockingWriter()
+        writer.release.set()
+        queue = WriteBehindQueue(writer, batch_size=16)
+        queue.put("apples")
+        assert writer.started.wait(0.5)
+        assert writer.batches == [["apples"]]
+
+    # Tests that texts queued during a write are coalesced into the next batches of at most batch_size.
+    def test_coalesces_while_writing(self):
+        writer = BlockingWriter()
+        queue = WriteBehindQueue(writer, batch_size=2)
+        queue.put("a")
+        assert writer.started.wait(5)
+        for text in ["b", "c", "d"]:
+            queue.put(text)
+        writer.release.set()
+        queue.flush()
+        assert writer.batches == [["a"], ["b", "c"], ["d"]]